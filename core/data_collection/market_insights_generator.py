@@ -6,6 +6,7 @@ Generates sector-based market insights for stocks with CumulativeScore >= 80
 
 from typing import List, Dict, Tuple
 from collections import defaultdict
+from html import escape
 import logging
 
 logger = logging.getLogger(__name__)
@@ -201,9 +202,11 @@ class MarketInsightsGenerator:
             # Alternate row colors for better readability
             row_color = "#f8f9fa" if i % 2 == 0 else "white"
             
-            ticker = stock.get('ticker', 'Unknown')
+            # Sector and ticker come straight from the sheet, so escape them (and the insight built from them)
+            sector = escape(str(sector))
+            ticker = escape(str(stock.get('ticker', 'Unknown')))
             overall_score = stock.get('overall_score', 0)
-            key_insight = self._generate_key_insight(stock)
+            key_insight = escape(self._generate_key_insight(stock))
             
             # Color code the score
             if overall_score >= 95:
@@ -271,7 +274,7 @@ class MarketInsightsGenerator:
         <div style="background-color: #f8d7da; padding: 20px; border-radius: 5px; border-left: 4px solid #dc3545;">
             <h3 style="color: #721c24; margin-top: 0;">❌ Error Generating Insights</h3>
             <p style="color: #721c24; margin-bottom: 0;">
-                Unable to generate market insights due to an error: <strong>{error}</strong>
+                Unable to generate market insights due to an error: <strong>{escape(str(error))}</strong>
             </p>
             <p style="color: #721c24; margin-bottom: 0;">
                 <strong>Action Required:</strong> Please check the data format and try again.
@@ -5,27 +5,272 @@ Uses data directly from Google Sheets instead of Yahoo Finance API
 """
 
 import os
+import re
+import argparse
+import sys
+import heapq
 import asyncio
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 import logging
 import gspread
 from google.oauth2.service_account import Credentials
 from datetime import datetime
+from html import escape
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from operator import itemgetter
 import random
+import numpy as np
 
 # Load environment
 load_dotenv("~/stock_digest_platform/.env")
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Make the external StockScoringAlgorithm importable (once, at module load)
+_SCORING_ALGORITHM_PATH = "/Users/shabeerpc/stock_digest_platform"
+if _SCORING_ALGORITHM_PATH not in sys.path:
+    sys.path.insert(0, _SCORING_ALGORITHM_PATH)
+
+# Industries penalised by the halal score (matched case-insensitively in one pass)
+_PROHIBITED_RE = re.compile(r'alcohol|gambling|tobacco|pork|weapons|casino', re.IGNORECASE)
+
+# Formatting stripped from numeric sheet cells, and placeholders treated as missing
+_NUMBER_FORMATTING_RE = re.compile(r'[$,%\s]')
+_MISSING_VALUES = frozenset(('#N/A', 'N/A', 'NA', ''))
+
+# Defaults for scoring inputs the source data may not provide. pe_ratio and
+# market_cap are left out because the hedge fund and fundamental scores
+# use different defaults for them.
+_SCORING_DEFAULTS = {
+    'industry': '',
+    'debt_to_equity': 1.0,
+    'free_cash_flow': 0,
+    'interest_income_ratio': 0,
+    'price_to_book': 1.5,
+    'return_on_equity': 0.1,
+    'volume': 1000000,
+    'average_volume': 2000000,
+    'bid_ask_spread': 0.01,
+    'shares_outstanding': 100000000,
+    'trend_30d': 0,
+    'trend_90d': 0,
+    'rsi': 50,
+    'volatility': 0.2,
+    'eps': 0,
+    'eps_growth': 0,
+    'revenue_growth': 0,
+    'profit_margin': 0
+}
+
+# Scoring ladders as (ascending thresholds, points per bucket); see _score_above/_score_below
+_HALAL_DEBT_LADDER = ((0.2, 0.4, 0.6, 0.8), (95, 85, 75, 60, 40))
+_HEDGE_PE_LADDER = ((8, 12, 18, 25), (40, 35, 25, 15, 5))
+_HEDGE_PB_LADDER = ((1, 1.5, 2, 3), (25, 20, 15, 10, 5))
+_HEDGE_ROE_LADDER = ((0.05, 0.10, 0.15), (5, 10, 15, 20))
+_HEDGE_MARKET_CAP_LADDER = ((1000000000, 10000000000), (5, 10, 15))  # >$1B, >$10B
+_ACTIVITY_VOLUME_LADDER = ((0.7, 1, 1.5, 2), (15, 25, 30, 35, 40))
+_ACTIVITY_SPREAD_LADDER = ((0.005, 0.01, 0.02, 0.05), (35, 30, 25, 20, 15))
+_ACTIVITY_TURNOVER_LADDER = ((0.02, 0.05, 0.1), (10, 15, 20, 25))
+_TREND_30D_LADDER = ((-10, -5, 0, 5, 10, 15), (10, 15, 20, 25, 30, 35, 40))
+_TREND_90D_LADDER = ((-10, 0, 10, 20), (10, 15, 20, 25, 30))
+_TREND_VOLATILITY_LADDER = ((0.15, 0.25, 0.35), (10, 8, 6, 4))
+_FUNDAMENTAL_EPS_LADDER = ((0, 1, 2, 3, 5), (5, 15, 18, 20, 22, 25))
+_FUNDAMENTAL_EPS_GROWTH_LADDER = ((0, 0.05, 0.10, 0.15, 0.20, 0.30), (5, 10, 12, 14, 16, 18, 20))
+_FUNDAMENTAL_REVENUE_LADDER = ((0, 0.05, 0.10, 0.15, 0.20, 0.25), (5, 10, 12, 14, 16, 18, 20))
+_FUNDAMENTAL_MARGIN_LADDER = ((0, 0.05, 0.10, 0.15, 0.20, 0.25), (3, 5, 7, 9, 11, 13, 15))
+_FUNDAMENTAL_PE_LADDER = ((15, 25, 35, 50), (10, 8, 6, 4, 2))
+_FUNDAMENTAL_DEBT_LADDER = ((0.2, 0.4, 0.6, 0.8), (10, 8, 6, 4, 2))
+
+def _score_above(value, ladder):
+    """Points for the highest threshold that value strictly exceeds."""
+    thresholds, points = ladder
+    return points[bisect_left(thresholds, value)]
+
+def _score_below(value, ladder):
+    """Points for the lowest threshold that value is strictly below."""
+    thresholds, points = ladder
+    return points[bisect_right(thresholds, value)]
+
+# Component scores fed to StockScoringAlgorithm, in column order
+_COMPONENT_SCORE_KEYS = ('halal_score', 'hedge_fund_score', 'activity_score', 'trend_score', 'fundamental_score')
+
+# Sentiment buckets: a score must exceed a boundary to reach the next label
+_SENTIMENT_BOUNDARIES = (60, 70, 80)
+_SENTIMENT_LABELS = ('Sell', 'Hold', 'Buy', 'Strong Buy')
+
+# Sector-leader score badges (color, emoji) for scores below 85, >= 85, >= 90 and >= 95
+_SCORE_BADGE_THRESHOLDS = (85, 90, 95)
+_SCORE_BADGES = (
+    ("#3498db", "✅"),  # Blue
+    ("#f39c12", "💪"),  # Orange
+    ("#2ecc71", "⭐"),  # Light Green
+    ("#27ae60", "🔥"),  # Green
+)
+
+# Market summary colors: sector averages above 65 / 75, and per-sentiment (others orange)
+_SECTOR_AVERAGE_THRESHOLDS = (65, 75)
+_SECTOR_AVERAGE_COLORS = ('#e74c3c', '#f39c12', '#27ae60')
+_SENTIMENT_COLORS = {'Strong Buy': '#27ae60', 'Buy': '#27ae60', 'Sell': '#e74c3c'}
+
+# Per-row HTML templates, parsed once and filled with str.format_map
+_TOP_PICK_ROW_TEMPLATE = """
+            <tr>
+                <td style="border: 1px solid #ddd; padding: 8px;">{rank}</td>
+                <td style="border: 1px solid #ddd; padding: 8px;"><strong>{ticker}</strong></td>
+                <td style="border: 1px solid #ddd; padding: 8px;">{company_name}</td>
+                <td style="border: 1px solid #ddd; padding: 8px;">{sector}</td>
+                <td style="border: 1px solid #ddd; padding: 8px;">${current_price:.2f}</td>
+                <td style="border: 1px solid #ddd; padding: 8px;"><strong>{overall_score}</strong></td>
+                <td style="border: 1px solid #ddd; padding: 8px;">{sentiment}</td>
+            </tr>
+            """
+
+_SECTOR_LEADER_ROW_TEMPLATE = """
+                    <tr style="background-color: {row_color};">
+                        <td style="padding: 12px; border-bottom: 1px solid #e9ecef; font-weight: 600; color: #2c3e50;">{sector}</td>
+                        <td style="padding: 12px; border-bottom: 1px solid #e9ecef; font-weight: 600; color: #34495e;">{ticker}</td>
+                        <td style="padding: 12px; border-bottom: 1px solid #e9ecef; text-align: center; font-weight: 600; color: {score_color}; font-size: 18px;">{score_emoji} {overall_score:.1f}</td>
+                        <td style="padding: 12px; border-bottom: 1px solid #e9ecef; color: #555; line-height: 1.4;">{key_insight}</td>
+                    </tr>
+            """
+
+# Static section markup, formatted only where a value is interpolated
+_TOP_PICKS_HEADER = """
+        <h2>🏆 Top 10 Stock Picks</h2>
+        <table style="width:100%; border-collapse: collapse; margin-bottom: 20px;">
+            <tr style="background-color: #f8f9fa;">
+                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Rank</th>
+                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Ticker</th>
+                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Company</th>
+                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Sector</th>
+                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Price</th>
+                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Overall Score</th>
+                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Sentiment</th>
+            </tr>
+        """
+
+_SECTOR_LEADERS_HEADER = """
+        <h2>📊 Market Insights by Sector</h2>
+        <div style="background-color: #f8f9fa; padding: 20px; border-radius: 5px; margin-bottom: 20px;">
+            <p style="margin-bottom: 15px; color: #2c3e50; font-size: 16px;">
+                <strong>🏆 Sector Leaders Analysis</strong> - Top stocks ranked by performance
+            </p>
+            
+            <table style="width:100%; border-collapse: collapse; background-color: white; border-radius: 5px; overflow: hidden; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
+                <thead>
+                    <tr style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white;">
+                        <th style="padding: 12px; text-align: left; border: none; font-weight: 600;">🏭 Sector</th>
+                        <th style="padding: 12px; text-align: left; border: none; font-weight: 600;">📈 Ticker</th>
+                        <th style="padding: 12px; text-align: center; border: none; font-weight: 600;">🎯 Score</th>
+                        <th style="padding: 12px; text-align: left; border: none; font-weight: 600;">💡 Key Insight</th>
+                    </tr>
+                </thead>
+                <tbody>
+        """
+
+_SECTOR_LEADERS_FOOTER = """
+                </tbody>
+            </table>
+            
+            <div style="margin-top: 15px; padding: 10px; background-color: #e8f5e8; border-left: 4px solid #27ae60; border-radius: 3px;">
+                <p style="margin: 0; color: #2d5a2d; font-size: 14px;">
+                    <strong>💡 Analysis Summary:</strong> These sector leaders represent the best investment opportunities 
+                    based on comprehensive scoring across Halal compliance, Hedge Fund appeal, Trading Activity, 
+                    Price Trends, and Fundamental strength.
+                </p>
+            </div>
+        </div>
+        """
+
+_COMPLETE_ANALYSIS_HEADER_TEMPLATE = """
+        <h2>📊 Complete Stock Analysis</h2>
+        <p><em>Showing all {total_stocks} stocks with comprehensive scoring</em></p>
+        <table style="width:100%; border-collapse: collapse; margin-bottom: 20px; font-size: 12px;">
+            <tr style="background-color: #f8f9fa;">
+                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Ticker</th>
+                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Company</th>
+                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Sector</th>
+                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Price</th>
+                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Halal</th>
+                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Hedge</th>
+                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Activity</th>
+                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Trend</th>
+                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Fundamental</th>
+                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Overall</th>
+                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Sentiment</th>
+            </tr>
+        """
+
+_EMAIL_TEMPLATE = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="utf-8">
+            <title>Daily Stock Digest - {current_date}</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 1200px; margin: 0 auto; padding: 20px; }}
+                h1 {{ color: #2c3e50; border-bottom: 3px solid #3498db; padding-bottom: 10px; }}
+                h2 {{ color: #34495e; margin-top: 30px; }}
+                h3 {{ color: #7f8c8d; }}
+                .header {{ background-color: #ecf0f1; padding: 20px; border-radius: 5px; margin-bottom: 30px; }}
+                .footer {{ background-color: #bdc3c7; padding: 15px; text-align: center; margin-top: 30px; border-radius: 5px; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>📈 Daily Stock Digest</h1>
+                    <p><strong>Date:</strong> {current_date}</p>
+                    <p><strong>Analysis:</strong> Comprehensive stock analysis using Google Sheets data</p>
+                </div>
+                
+                {market_summary}
+                
+                {top_10_picks}
+                
+                {market_insights}
+                
+                {complete_analysis}
+                
+                <div class="footer">
+                    <p><em>This digest was generated automatically using your Google Sheets stock data.</em></p>
+                    <p><em>Powered by Stock Digest Platform</em></p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+_COMPLETE_ANALYSIS_ROW_TEMPLATE = """
+            <tr>
+                <td style="border: 1px solid #ddd; padding: 6px;"><strong>{ticker}</strong></td>
+                <td style="border: 1px solid #ddd; padding: 6px;">{company_name}</td>
+                <td style="border: 1px solid #ddd; padding: 6px;">{sector}</td>
+                <td style="border: 1px solid #ddd; padding: 6px;">${current_price:.2f}</td>
+                <td style="border: 1px solid #ddd; padding: 6px;">{halal_score}</td>
+                <td style="border: 1px solid #ddd; padding: 6px;">{hedge_fund_score}</td>
+                <td style="border: 1px solid #ddd; padding: 6px;">{activity_score}</td>
+                <td style="border: 1px solid #ddd; padding: 6px;">{trend_score}</td>
+                <td style="border: 1px solid #ddd; padding: 6px;">{fundamental_score}</td>
+                <td style="border: 1px solid #ddd; padding: 6px;"><strong>{overall_score}</strong></td>
+                <td style="border: 1px solid #ddd; padding: 6px;">{sentiment}</td>
+            </tr>
+            """
+
+def _escape_row(stock):
+    """Copy of a stock dict with its sheet-sourced string values HTML-escaped."""
+    return {key: escape(value) if isinstance(value, str) else value for key, value in stock.items()}
+
 class GoogleSheetsDigestWithData:
     def __init__(self):
         self.smtp_host = "smtp.gmail.com"
-        self.smtp_port = 587
+        # Gmail accepts implicit TLS on 465, saving the STARTTLS round-trips; SMTP_USE_SSL=0 falls back to 587
+        self.smtp_use_ssl = os.getenv("SMTP_USE_SSL", "1") != "0"
+        self.smtp_port = 465 if self.smtp_use_ssl else 587
         self.smtp_user = os.getenv("SMTP_USER")
         self.smtp_password = os.getenv("SMTP_PASSWORD")
         
@@ -35,14 +280,33 @@ class GoogleSheetsDigestWithData:
             'https://spreadsheets.google.com/feeds',
             'https://www.googleapis.com/auth/spreadsheets'
         ]
+        self.client = None
+        self._spreadsheet = None
+        
+        # Resolve environment-derived settings once rather than per call
+        self.credentials_available = bool(self.credentials_path) and os.path.exists(self.credentials_path)
+        self.spreadsheet_url = os.getenv("GOOGLE_SHEETS_URL")
+        self._spreadsheet_id = self._parse_spreadsheet_id(self.spreadsheet_url)
+        self.default_recipient = os.getenv("DAILY_DIGEST_RECIPIENT")
+        
+        # SMTP connection is opened on first send and reused across messages
+        self._smtp = None
+        self._smtp_lock = threading.Lock()
+        
+        # Scoring algorithm is loaded once on first use (see _load_scoring_algorithm)
+        self.scoring_algorithm = None
+        self._scoring_import_error = None
         
     def setup_google_sheets(self):
         """Setup Google Sheets connection."""
         try:
-            if not self.credentials_path or not os.path.exists(self.credentials_path):
+            if not self.credentials_available:
                 logger.error(f"❌ Credentials file not found: {self.credentials_path}")
                 return False
             
+            if self.client is not None:
+                return True
+            
             creds = Credentials.from_service_account_file(self.credentials_path, scopes=self.scope)
             self.client = gspread.authorize(creds)
             logger.info("✅ Google Sheets connection established")
@@ -52,41 +316,54 @@ class GoogleSheetsDigestWithData:
             logger.error(f"❌ Failed to setup Google Sheets: {e}")
             return False
     
+    def _load_scoring_algorithm(self):
+        """Import and initialize StockScoringAlgorithm once, returning None if unavailable."""
+        if self.scoring_algorithm is None and self._scoring_import_error is None:
+            try:
+                from stock_scoring_algorithm import StockScoringAlgorithm
+                self.scoring_algorithm = StockScoringAlgorithm()
+            except Exception as e:
+                # Import or construction failures both fall back to simplified scoring
+                self._scoring_import_error = e
+        return self.scoring_algorithm
+    
+    def _parse_spreadsheet_id(self, spreadsheet_url):
+        """Extract the spreadsheet ID from a Google Sheets URL, or None if it has none."""
+        if not spreadsheet_url or "/d/" not in spreadsheet_url:
+            return None
+        return spreadsheet_url.split("/d/")[1].split("/")[0]
+    
     def read_stocks_from_sheet(self, worksheet_name="Sheet6"):
         """Read stock data from Google Sheets using direct ID access."""
         try:
-            # Get spreadsheet URL and extract ID
-            spreadsheet_url = os.getenv("GOOGLE_SHEETS_URL")
-            if not spreadsheet_url:
+            if not self.spreadsheet_url:
                 logger.error("❌ GOOGLE_SHEETS_URL not found in .env file")
                 return []
             
-            # Extract spreadsheet ID from URL
-            if "/d/" in spreadsheet_url:
-                spreadsheet_id = spreadsheet_url.split("/d/")[1].split("/")[0]
-                logger.info(f"📊 Using spreadsheet ID: {spreadsheet_id}")
-            else:
+            if not self._spreadsheet_id:
                 logger.error("❌ Could not extract spreadsheet ID from URL")
                 return []
             
-            # Open spreadsheet directly by ID
-            spreadsheet = self.client.open_by_key(spreadsheet_id)
-            worksheet = spreadsheet.worksheet(worksheet_name)
-            all_data = worksheet.get_all_records()
+            # Open spreadsheet directly by ID once and reuse the handle
+            if self._spreadsheet is None:
+                logger.info(f"📊 Using spreadsheet ID: {self._spreadsheet_id}")
+                self._spreadsheet = self.client.open_by_key(self._spreadsheet_id)
+            worksheet = self._spreadsheet.worksheet(worksheet_name)
+            
+            # Pull the raw 2D grid in one call and zip rows onto the header row,
+            # skipping gspread's per-cell type inference in get_all_records()
+            values = worksheet.get_values()
+            if not values:
+                return []
+            headers = values[0]
+            all_data = [dict(zip(headers, values_row)) for values_row in values[1:]]
+            
+            # Sheet cells arrive as strings, so convert with the formatting-aware helper
+            safe_float = self._safe_float
             
             stocks = []
             for row in all_data:
                 if row.get('Ticker') and row.get('Ticker').strip():
-                    # Convert Google Sheets data to our format with safe conversion
-                    def safe_float(value, default=0):
-                        """Safely convert value to float, handling #N/A and other invalid values."""
-                        if not value or value == '#N/A' or value == '#N/A':
-                            return default
-                        try:
-                            return float(value)
-                        except (ValueError, TypeError):
-                            return default
-                    
                     stock = {
                         'ticker': row.get('Ticker', '').strip().upper(),
                         'company_name': row.get('Company Name', ''),
@@ -118,58 +395,59 @@ class GoogleSheetsDigestWithData:
         """Calculate scores for stocks using the actual StockScoringAlgorithm."""
         logger.info("🔢 Calculating scores using StockScoringAlgorithm...")
         
+        if self._load_scoring_algorithm() is None:
+            logger.error(f"❌ Failed to load StockScoringAlgorithm: {self._scoring_import_error}")
+            logger.info("🔄 Falling back to simplified scoring...")
+            return self._calculate_scores_simplified(stocks)
+        
         try:
-            # Import the actual scoring algorithm
-            import sys
-            sys.path.insert(0, "/Users/shabeerpc/stock_digest_platform")
-            from stock_scoring_algorithm import StockScoringAlgorithm
+            scoring_algorithm = self.scoring_algorithm
             
-            # Initialize the scoring algorithm
-            scoring_algorithm = StockScoringAlgorithm()
+            # First calculate individual scores using our logic
+            for stock in stocks:
+                self._calculate_individual_scores(stock)
+            
+            # Calculate cumulative scores in one (N, 5) call when the algorithm supports it
+            batch_scorer = getattr(scoring_algorithm, 'calculate_cumulative_score_batch', None)
+            if batch_scorer is not None and stocks:
+                component_matrix = np.array(
+                    [[stock[key] for key in _COMPONENT_SCORE_KEYS] for stock in stocks],
+                    dtype=np.float64
+                )
+                cumulative_scores = np.asarray(batch_scorer(component_matrix), dtype=np.float64)
+                for stock, cumulative_score in zip(stocks, cumulative_scores.tolist()):
+                    stock['overall_score'] = cumulative_score
+            else:
+                for stock in stocks:
+                    # Now prepare data for the scoring algorithm
+                    stock_data = {key: stock[key] for key in _COMPONENT_SCORE_KEYS}
+                    
+                    # Calculate cumulative score using the algorithm
+                    scores = scoring_algorithm.calculate_cumulative_score(stock_data)
+                    
+                    # Update the overall score
+                    stock['overall_score'] = scores.get('cumulative_score', stock['overall_score'])
             
+            debug_enabled = logger.isEnabledFor(logging.DEBUG)
             for stock in stocks:
-                # First calculate individual scores using our logic
-                stock = self._calculate_individual_scores(stock)
-                
-                # Now prepare data for the scoring algorithm
-                stock_data = {
-                    'halal_score': stock['halal_score'],
-                    'hedge_fund_score': stock['hedge_fund_score'],
-                    'activity_score': stock['activity_score'],
-                    'trend_score': stock['trend_score'],
-                    'fundamental_score': stock['fundamental_score']
-                }
-                
-                # Calculate cumulative score using the algorithm
-                scores = scoring_algorithm.calculate_cumulative_score(stock_data)
-                
-                # Update the overall score
-                stock['overall_score'] = scores.get('cumulative_score', stock['overall_score'])
-                
                 # Add sentiment based on overall score
-                if stock['overall_score'] > 80:
-                    stock['sentiment'] = 'Strong Buy'
-                elif stock['overall_score'] > 70:
-                    stock['sentiment'] = 'Buy'
-                elif stock['overall_score'] > 60:
-                    stock['sentiment'] = 'Hold'
-                else:
-                    stock['sentiment'] = 'Sell'
+                stock['sentiment'] = self._get_sentiment(stock['overall_score'])
                 
-                logger.debug(f"✅ Calculated scores for {stock['ticker']}: Overall={stock['overall_score']:.2f}")
+                if debug_enabled:
+                    logger.debug("✅ Calculated scores for %s: Overall=%.2f", stock['ticker'], stock['overall_score'])
             
             logger.info(f"✅ Calculated scores for {len(stocks)} stocks using StockScoringAlgorithm")
             return stocks
             
-        except ImportError as e:
-            logger.error(f"❌ Failed to import StockScoringAlgorithm: {e}")
-            logger.info("🔄 Falling back to simplified scoring...")
-            return self._calculate_scores_simplified(stocks)
         except Exception as e:
             logger.error(f"❌ Error in StockScoringAlgorithm: {e}")
             logger.info("🔄 Falling back to simplified scoring...")
             return self._calculate_scores_simplified(stocks)
     
+    def _get_sentiment(self, overall_score):
+        """Map an overall score to its sentiment label with a single bisect."""
+        return _SENTIMENT_LABELS[bisect_left(_SENTIMENT_BOUNDARIES, overall_score)]
+    
     def _safe_float(self, value, default=0):
         """Safely convert value to float, handling strings and invalid values."""
         if value is None:
@@ -177,9 +455,9 @@ class GoogleSheetsDigestWithData:
         if isinstance(value, (int, float)):
             return float(value)
         if isinstance(value, str):
-            # Remove common formatting characters
-            cleaned = value.replace('$', '').replace(',', '').replace('%', '').strip()
-            if cleaned in ['#N/A', 'N/A', 'NA', '']:
+            # Remove common formatting characters in a single pass
+            cleaned = _NUMBER_FORMATTING_RE.sub('', value)
+            if cleaned in _MISSING_VALUES:
                 return default
             try:
                 return float(cleaned)
@@ -189,24 +467,27 @@ class GoogleSheetsDigestWithData:
     
     def _calculate_individual_scores(self, stock):
         """Calculate individual scores for a stock using deterministic algorithms."""
+        # Fill scoring inputs missing from the source data in one merge
+        stock_data = {**_SCORING_DEFAULTS, **stock}
+        
         # Calculate Halal Score (0-100) - based on Islamic finance principles
-        halal_score = self._calculate_halal_score(stock)
+        halal_score = self._calculate_halal_score(stock_data)
         stock['halal_score'] = round(halal_score, 2)
         
         # Calculate Hedge Fund Score (0-100) - based on multiple financial metrics
-        hedge_score = self._calculate_hedge_fund_score(stock)
+        hedge_score = self._calculate_hedge_fund_score(stock_data)
         stock['hedge_fund_score'] = round(hedge_score, 2)
         
         # Calculate Activity Score (0-100) - based on trading activity and liquidity
-        activity_score = self._calculate_activity_score(stock)
+        activity_score = self._calculate_activity_score(stock_data)
         stock['activity_score'] = round(activity_score, 2)
         
         # Calculate Trend Score (0-100) - based on price momentum and volatility
-        trend_score = self._calculate_trend_score(stock)
+        trend_score = self._calculate_trend_score(stock_data)
         stock['trend_score'] = round(trend_score, 2)
         
         # Calculate Fundamental Score (0-100) - based on financial strength and growth
-        fundamental_score = self._calculate_fundamental_score(stock)
+        fundamental_score = self._calculate_fundamental_score(stock_data)
         stock['fundamental_score'] = round(fundamental_score, 2)
         
         # Calculate initial overall score (will be updated by algorithm)
@@ -223,22 +504,13 @@ class GoogleSheetsDigestWithData:
     
     def _calculate_halal_score(self, stock_data):
         """Calculate halal score based on Islamic finance principles."""
-        debt_ratio = self._safe_float(stock_data.get('debt_to_equity', 1.0))
-        free_cash_flow = self._safe_float(stock_data.get('free_cash_flow', 0))
-        interest_income_ratio = self._safe_float(stock_data.get('interest_income_ratio', 0))
-        industry = stock_data.get('industry', '').lower()
+        debt_ratio = self._safe_float(stock_data['debt_to_equity'])
+        free_cash_flow = self._safe_float(stock_data['free_cash_flow'])
+        interest_income_ratio = self._safe_float(stock_data['interest_income_ratio'])
+        industry = stock_data['industry']
         
         # Base score from debt/equity ratio
-        if debt_ratio < 0.2:
-            base_score = 95
-        elif debt_ratio < 0.4:
-            base_score = 85
-        elif debt_ratio < 0.6:
-            base_score = 75
-        elif debt_ratio < 0.8:
-            base_score = 60
-        else:
-            base_score = 40
+        base_score = _score_below(debt_ratio, _HALAL_DEBT_LADDER)
         
         # Adjustments
         if free_cash_flow > 0:
@@ -248,8 +520,7 @@ class GoogleSheetsDigestWithData:
             base_score += 5
         
         # Industry penalties for non-halal sectors
-        prohibited_industries = ['alcohol', 'gambling', 'tobacco', 'pork', 'weapons', 'casino']
-        if any(prohibited in industry for prohibited in prohibited_industries):
+        if _PROHIBITED_RE.search(industry):
             base_score = max(0, base_score - 30)
         
         return min(100, max(0, base_score))
@@ -258,135 +529,48 @@ class GoogleSheetsDigestWithData:
         """Calculate hedge fund attractiveness score."""
         # Convert to proper types with safe defaults
         pe_ratio = self._safe_float(stock_data.get('pe_ratio', 15))
-        pb_ratio = self._safe_float(stock_data.get('price_to_book', 1.5))
-        roe = self._safe_float(stock_data.get('return_on_equity', 0.1))
+        pb_ratio = self._safe_float(stock_data['price_to_book'])
+        roe = self._safe_float(stock_data['return_on_equity'])
         market_cap = self._safe_float(stock_data.get('market_cap', 1000000000))
         
-        # PE Ratio scoring (0-40 points)
-        if pe_ratio < 8:
-            pe_score = 40
-        elif pe_ratio < 12:
-            pe_score = 35
-        elif pe_ratio < 18:
-            pe_score = 25
-        elif pe_ratio < 25:
-            pe_score = 15
-        else:
-            pe_score = 5
-        
-        # Price-to-Book scoring (0-25 points)
-        if pb_ratio < 1:
-            pb_score = 25
-        elif pb_ratio < 1.5:
-            pb_score = 20
-        elif pb_ratio < 2:
-            pb_score = 15
-        elif pb_ratio < 3:
-            pb_score = 10
-        else:
-            pb_score = 5
-        
-        # ROE scoring (0-20 points)
-        if roe > 0.15:
-            roe_score = 20
-        elif roe > 0.10:
-            roe_score = 15
-        elif roe > 0.05:
-            roe_score = 10
-        else:
-            roe_score = 5
-        
-        # Market cap bonus (0-15 points)
-        if market_cap > 10000000000:  # >$10B
-            cap_score = 15
-        elif market_cap > 1000000000:  # >$1B
-            cap_score = 10
-        else:
-            cap_score = 5
+        pe_score = _score_below(pe_ratio, _HEDGE_PE_LADDER)          # 0-40 points
+        pb_score = _score_below(pb_ratio, _HEDGE_PB_LADDER)          # 0-25 points
+        roe_score = _score_above(roe, _HEDGE_ROE_LADDER)             # 0-20 points
+        cap_score = _score_above(market_cap, _HEDGE_MARKET_CAP_LADDER)  # 0-15 points
         
         total_score = pe_score + pb_score + roe_score + cap_score
         return min(100, total_score)
     
     def _calculate_activity_score(self, stock_data):
         """Calculate trading activity score."""
-        volume = self._safe_float(stock_data.get('volume', 1000000))
-        avg_volume = self._safe_float(stock_data.get('average_volume', 2000000))
-        bid_ask_spread = self._safe_float(stock_data.get('bid_ask_spread', 0.01))
-        shares_outstanding = self._safe_float(stock_data.get('shares_outstanding', 100000000))
+        volume = self._safe_float(stock_data['volume'])
+        avg_volume = self._safe_float(stock_data['average_volume'])
+        bid_ask_spread = self._safe_float(stock_data['bid_ask_spread'])
+        shares_outstanding = self._safe_float(stock_data['shares_outstanding'])
         
         # Volume relative to average (0-40 points)
         volume_ratio = volume / avg_volume if avg_volume > 0 else 1
-        if volume_ratio > 2:
-            volume_score = 40
-        elif volume_ratio > 1.5:
-            volume_score = 35
-        elif volume_ratio > 1:
-            volume_score = 30
-        elif volume_ratio > 0.7:
-            volume_score = 25
-        else:
-            volume_score = 15
+        volume_score = _score_above(volume_ratio, _ACTIVITY_VOLUME_LADDER)
         
         # Liquidity scoring (0-35 points)
-        if bid_ask_spread < 0.005:
-            liquidity_score = 35
-        elif bid_ask_spread < 0.01:
-            liquidity_score = 30
-        elif bid_ask_spread < 0.02:
-            liquidity_score = 25
-        elif bid_ask_spread < 0.05:
-            liquidity_score = 20
-        else:
-            liquidity_score = 15
+        liquidity_score = _score_below(bid_ask_spread, _ACTIVITY_SPREAD_LADDER)
         
         # Market participation (0-25 points)
         turnover_ratio = volume / shares_outstanding if shares_outstanding > 0 else 0
-        if turnover_ratio > 0.1:
-            turnover_score = 25
-        elif turnover_ratio > 0.05:
-            turnover_score = 20
-        elif turnover_ratio > 0.02:
-            turnover_score = 15
-        else:
-            turnover_score = 10
+        turnover_score = _score_above(turnover_ratio, _ACTIVITY_TURNOVER_LADDER)
         
         total_score = volume_score + liquidity_score + turnover_score
         return min(100, total_score)
     
     def _calculate_trend_score(self, stock_data):
         """Calculate price trend and momentum score."""
-        trend_30d = self._safe_float(stock_data.get('trend_30d', 0))
-        trend_90d = self._safe_float(stock_data.get('trend_90d', 0))
-        rsi = self._safe_float(stock_data.get('rsi', 50))
-        volatility = self._safe_float(stock_data.get('volatility', 0.2))
-        
-        # 30-day trend (0-40 points)
-        if trend_30d > 15:
-            trend_30_score = 40
-        elif trend_30d > 10:
-            trend_30_score = 35
-        elif trend_30d > 5:
-            trend_30_score = 30
-        elif trend_30d > 0:
-            trend_30_score = 25
-        elif trend_30d > -5:
-            trend_30_score = 20
-        elif trend_30d > -10:
-            trend_30_score = 15
-        else:
-            trend_30_score = 10
-        
-        # 90-day trend (0-30 points)
-        if trend_90d > 20:
-            trend_90_score = 30
-        elif trend_90d > 10:
-            trend_90_score = 25
-        elif trend_90d > 0:
-            trend_90_score = 20
-        elif trend_90d > -10:
-            trend_90_score = 15
-        else:
-            trend_90_score = 10
+        trend_30d = self._safe_float(stock_data['trend_30d'])
+        trend_90d = self._safe_float(stock_data['trend_90d'])
+        rsi = self._safe_float(stock_data['rsi'])
+        volatility = self._safe_float(stock_data['volatility'])
+        
+        trend_30_score = _score_above(trend_30d, _TREND_30D_LADDER)  # 0-40 points
+        trend_90_score = _score_above(trend_90d, _TREND_90D_LADDER)  # 0-30 points
         
         # RSI momentum (0-20 points)
         if 40 < rsi < 60:
@@ -396,117 +580,34 @@ class GoogleSheetsDigestWithData:
         else:
             rsi_score = 10
         
-        # Volatility adjustment (0-10 points)
-        if volatility < 0.15:
-            vol_score = 10  # Low volatility is good
-        elif volatility < 0.25:
-            vol_score = 8
-        elif volatility < 0.35:
-            vol_score = 6
-        else:
-            vol_score = 4
+        # Volatility adjustment (0-10 points) - low volatility is good
+        vol_score = _score_below(volatility, _TREND_VOLATILITY_LADDER)
         
         total_score = trend_30_score + trend_90_score + rsi_score + vol_score
         return min(100, total_score)
     
     def _calculate_fundamental_score(self, stock_data):
         """Calculate fundamental financial strength score with improved algorithm."""
-        eps = self._safe_float(stock_data.get('eps', 0))
-        eps_growth = self._safe_float(stock_data.get('eps_growth', 0))
-        revenue_growth = self._safe_float(stock_data.get('revenue_growth', 0))
-        profit_margin = self._safe_float(stock_data.get('profit_margin', 0))
-        debt_to_equity = self._safe_float(stock_data.get('debt_to_equity', 1.0))
+        eps = self._safe_float(stock_data['eps'])
+        eps_growth = self._safe_float(stock_data['eps_growth'])
+        revenue_growth = self._safe_float(stock_data['revenue_growth'])
+        profit_margin = self._safe_float(stock_data['profit_margin'])
+        debt_to_equity = self._safe_float(stock_data['debt_to_equity'])
         pe_ratio = self._safe_float(stock_data.get('pe_ratio', 0))
-        market_cap = self._safe_float(stock_data.get('market_cap', 0))
-        
-        # EPS scoring (0-25 points) - Fixed logic and adjusted weights
-        if eps > 5:
-            eps_score = 25
-        elif eps > 3:
-            eps_score = 22
-        elif eps > 2:
-            eps_score = 20
-        elif eps > 1:
-            eps_score = 18
-        elif eps > 0:
-            eps_score = 15  # Fixed: was incorrectly 25
-        else:
-            eps_score = 5
-        
-        # EPS Growth scoring (0-20 points) - More realistic thresholds
-        if eps_growth > 0.30:
-            growth_score = 20
-        elif eps_growth > 0.20:
-            growth_score = 18
-        elif eps_growth > 0.15:
-            growth_score = 16
-        elif eps_growth > 0.10:
-            growth_score = 14
-        elif eps_growth > 0.05:
-            growth_score = 12
-        elif eps_growth > 0:
-            growth_score = 10
-        else:
-            growth_score = 5  # Give some points even for negative growth
-        
-        # Revenue Growth scoring (0-20 points) - Better thresholds for tech companies
-        if revenue_growth > 0.25:
-            revenue_score = 20
-        elif revenue_growth > 0.20:
-            revenue_score = 18
-        elif revenue_growth > 0.15:
-            revenue_score = 16
-        elif revenue_growth > 0.10:
-            revenue_score = 14
-        elif revenue_growth > 0.05:
-            revenue_score = 12
-        elif revenue_growth > 0:
-            revenue_score = 10
-        else:
-            revenue_score = 5  # Give some points even for negative growth
-        
-        # Profit Margin scoring (0-15 points) - More nuanced
-        if profit_margin > 0.25:
-            margin_score = 15
-        elif profit_margin > 0.20:
-            margin_score = 13
-        elif profit_margin > 0.15:
-            margin_score = 11
-        elif profit_margin > 0.10:
-            margin_score = 9
-        elif profit_margin > 0.05:
-            margin_score = 7
-        elif profit_margin > 0:
-            margin_score = 5
-        else:
-            margin_score = 3  # Even negative margins get some points
+        
+        eps_score = _score_above(eps, _FUNDAMENTAL_EPS_LADDER)                   # 0-25 points
+        growth_score = _score_above(eps_growth, _FUNDAMENTAL_EPS_GROWTH_LADDER)  # 0-20 points
+        revenue_score = _score_above(revenue_growth, _FUNDAMENTAL_REVENUE_LADDER)  # 0-20 points
+        margin_score = _score_above(profit_margin, _FUNDAMENTAL_MARGIN_LADDER)   # 0-15 points
         
         # PE Ratio scoring (0-10 points) - New component for valuation
         if pe_ratio > 0:  # Valid PE ratio
-            if pe_ratio < 15:
-                pe_score = 10  # Very attractive
-            elif pe_ratio < 25:
-                pe_score = 8   # Attractive
-            elif pe_ratio < 35:
-                pe_score = 6   # Reasonable
-            elif pe_ratio < 50:
-                pe_score = 4   # High but acceptable
-            else:
-                pe_score = 2   # Very high
+            pe_score = _score_below(pe_ratio, _FUNDAMENTAL_PE_LADDER)
         else:
             pe_score = 5  # Default for missing data
         
         # Financial Health bonus (0-10 points) - Improved debt scoring
-        if debt_to_equity < 0.2:
-            health_score = 10
-        elif debt_to_equity < 0.4:
-            health_score = 8
-        elif debt_to_equity < 0.6:
-            health_score = 6
-        elif debt_to_equity < 0.8:
-            health_score = 4
-        else:
-            health_score = 2
+        health_score = _score_below(debt_to_equity, _FUNDAMENTAL_DEBT_LADDER)
         
         total_score = eps_score + growth_score + revenue_score + margin_score + pe_score + health_score
         return min(100, total_score)
@@ -520,54 +621,28 @@ class GoogleSheetsDigestWithData:
             stock = self._calculate_individual_scores(stock)
             
             # Add sentiment
-            if stock['overall_score'] > 80:
-                stock['sentiment'] = 'Strong Buy'
-            elif stock['overall_score'] > 70:
-                stock['sentiment'] = 'Buy'
-            elif stock['overall_score'] > 60:
-                stock['sentiment'] = 'Hold'
-            else:
-                stock['sentiment'] = 'Buy'
+            stock['sentiment'] = self._get_sentiment(stock['overall_score'])
             
-            logger.debug(f"✅ Calculated simplified scores for {stock['ticker']}: Overall={stock['overall_score']:.2f}")
+            logger.debug("✅ Calculated simplified scores for %s: Overall=%.2f", stock['ticker'], stock['overall_score'])
         
         logger.info(f"✅ Calculated simplified scores for {len(stocks)} stocks")
         return stocks
     
-    def generate_top_10_picks(self, scored_stocks):
-        """Generate top 10 stock picks."""
-        # Sort by overall score and get top 10
-        top_stocks = sorted(scored_stocks, key=lambda x: x['overall_score'], reverse=True)[:10]
+    def generate_top_10_picks(self, scored_stocks, sorted_stocks=None):
+        """Generate top 10 stock picks, reusing sorted_stocks when already ranked by score."""
+        if sorted_stocks is not None:
+            top_stocks = sorted_stocks[:10]
+        else:
+            # Select the top 10 by overall score without sorting the full list
+            top_stocks = heapq.nlargest(10, scored_stocks, key=itemgetter('overall_score'))
         
-        html_content = """
-        <h2>🏆 Top 10 Stock Picks</h2>
-        <table style="width:100%; border-collapse: collapse; margin-bottom: 20px;">
-            <tr style="background-color: #f8f9fa;">
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Rank</th>
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Ticker</th>
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Company</th>
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Sector</th>
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Price</th>
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Overall Score</th>
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Sentiment</th>
-            </tr>
-        """
+        parts = [_TOP_PICKS_HEADER]
         
-        for i, stock in enumerate(top_stocks, 1):
-            html_content += f"""
-            <tr>
-                <td style="border: 1px solid #ddd; padding: 8px;">{i}</td>
-                <td style="border: 1px solid #ddd; padding: 8px;"><strong>{stock['ticker']}</strong></td>
-                <td style="border: 1px solid #ddd; padding: 8px;">{stock['company_name']}</td>
-                <td style="border: 1px solid #ddd; padding: 8px;">{stock['sector']}</td>
-                <td style="border: 1px solid #ddd; padding: 8px;">${stock['current_price']:.2f}</td>
-                <td style="border: 1px solid #ddd; padding: 8px;"><strong>{stock['overall_score']}</strong></td>
-                <td style="border: 1px solid #ddd; padding: 8px;">{stock['sentiment']}</td>
-            </tr>
-            """
+        row_template = _TOP_PICK_ROW_TEMPLATE.format
+        parts.extend(row_template(rank=i, **_escape_row(stock)) for i, stock in enumerate(top_stocks, 1))
         
-        html_content += "</table>"
-        return html_content
+        parts.append("</table>")
+        return ''.join(parts)
     
     def generate_market_insights(self, scored_stocks):
         """Generate market insights section using the MarketInsightsGenerator."""
@@ -585,48 +660,27 @@ class GoogleSheetsDigestWithData:
     
     def _generate_market_insights_fallback(self, scored_stocks):
         """Fallback market insights generation method."""
-        # Get top performing stocks by sector
-        sector_stocks = {}
+        # Find best stock per sector in a single pass (first stock wins ties)
+        sector_leaders = {}
         for stock in scored_stocks:
             sector = stock.get('sector', 'Unknown')
-            if sector not in sector_stocks:
-                sector_stocks[sector] = []
-            sector_stocks[sector].append(stock)
-        
-        # Find best stock per sector
-        sector_leaders = {}
-        for sector, stocks in sector_stocks.items():
-            if stocks:
-                best_stock = max(stocks, key=lambda x: x.get('overall_score', 0))
-                sector_leaders[sector] = best_stock
+            leader = sector_leaders.get(sector)
+            if leader is None or stock.get('overall_score', 0) > leader.get('overall_score', 0):
+                sector_leaders[sector] = stock
         
         # Sort sectors by best stock's overall score
-        sorted_sectors = sorted(sector_leaders.items(), key=lambda x: x[1].get('overall_score', 0), reverse=True)
+        leader_scores = [(sector, stock, stock.get('overall_score', 0)) for sector, stock in sector_leaders.items()]
+        leader_scores.sort(key=itemgetter(2), reverse=True)
+        sorted_sectors = [(sector, stock) for sector, stock, _ in leader_scores]
         
-        html_content = """
-        <h2>📊 Market Insights by Sector</h2>
-        <div style="background-color: #f8f9fa; padding: 20px; border-radius: 5px; margin-bottom: 20px;">
-            <p style="margin-bottom: 15px; color: #2c3e50; font-size: 16px;">
-                <strong>🏆 Sector Leaders Analysis</strong> - Top stocks ranked by performance
-            </p>
-            
-            <table style="width:100%; border-collapse: collapse; background-color: white; border-radius: 5px; overflow: hidden; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                <thead>
-                    <tr style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white;">
-                        <th style="padding: 12px; text-align: left; border: none; font-weight: 600;">🏭 Sector</th>
-                        <th style="padding: 12px; text-align: left; border: none; font-weight: 600;">📈 Ticker</th>
-                        <th style="padding: 12px; text-align: center; border: none; font-weight: 600;">🎯 Score</th>
-                        <th style="padding: 12px; text-align: left; border: none; font-weight: 600;">💡 Key Insight</th>
-                    </tr>
-                </thead>
-                <tbody>
-        """
+        parts = [_SECTOR_LEADERS_HEADER]
         
         for i, (sector, stock) in enumerate(sorted_sectors):
+            sector = escape(str(sector))
             # Alternate row colors for better readability
             row_color = "#f8f9fa" if i % 2 == 0 else "white"
             
-            ticker = stock.get('ticker', 'Unknown')
+            ticker = escape(str(stock.get('ticker', 'Unknown')))
             overall_score = stock.get('overall_score', 0)
             
             # Generate insight based on strongest score
@@ -645,7 +699,7 @@ class GoogleSheetsDigestWithData:
                 ('Fundamental', fundamental_score)
             ]
             
-            strongest_score_name, strongest_score_value = max(scores, key=lambda x: x[1])
+            strongest_score_name, strongest_score_value = max(scores, key=itemgetter(1))
             
             # Generate insight based on strongest score
             if strongest_score_name == 'Halal' and strongest_score_value >= 90:
@@ -667,110 +721,62 @@ class GoogleSheetsDigestWithData:
                     key_insight = f"{ticker} is the top performer in {sector} with strong cumulative scoring."
             
             # Color code the score
-            if overall_score >= 95:
-                score_color = "#27ae60"  # Green
-                score_emoji = "🔥"
-            elif overall_score >= 90:
-                score_color = "#2ecc71"  # Light Green
-                score_emoji = "⭐"
-            elif overall_score >= 85:
-                score_color = "#f39c12"  # Orange
-                score_emoji = "💪"
-            else:
-                score_color = "#3498db"  # Blue
-                score_emoji = "✅"
+            score_color, score_emoji = _SCORE_BADGES[bisect_right(_SCORE_BADGE_THRESHOLDS, overall_score)]
             
-            html_content += f"""
-                    <tr style="background-color: {row_color};">
-                        <td style="padding: 12px; border-bottom: 1px solid #e9ecef; font-weight: 600; color: #2c3e50;">{sector}</td>
-                        <td style="padding: 12px; border-bottom: 1px solid #e9ecef; font-weight: 600; color: #34495e;">{ticker}</td>
-                        <td style="padding: 12px; border-bottom: 1px solid #e9ecef; text-align: center; font-weight: 600; color: {score_color}; font-size: 18px;">{score_emoji} {overall_score:.1f}</td>
-                        <td style="padding: 12px; border-bottom: 1px solid #e9ecef; color: #555; line-height: 1.4;">{key_insight}</td>
-                    </tr>
-            """
+            parts.append(_SECTOR_LEADER_ROW_TEMPLATE.format_map({
+                'row_color': row_color,
+                'sector': sector,
+                'ticker': ticker,
+                'score_color': score_color,
+                'score_emoji': score_emoji,
+                'overall_score': overall_score,
+                'key_insight': key_insight
+            }))
         
-        html_content += """
-                </tbody>
-            </table>
-            
-            <div style="margin-top: 15px; padding: 10px; background-color: #e8f5e8; border-left: 4px solid #27ae60; border-radius: 3px;">
-                <p style="margin: 0; color: #2d5a2d; font-size: 14px;">
-                    <strong>💡 Analysis Summary:</strong> These sector leaders represent the best investment opportunities 
-                    based on comprehensive scoring across Halal compliance, Hedge Fund appeal, Trading Activity, 
-                    Price Trends, and Fundamental strength.
-                </p>
-            </div>
-        </div>
-        """
+        parts.append(_SECTOR_LEADERS_FOOTER)
         
-        return html_content
+        return ''.join(parts)
     
-    def generate_complete_analysis(self, scored_stocks):
-        """Generate complete stock analysis table."""
-        html_content = """
-        <h2>📊 Complete Stock Analysis</h2>
-        <p><em>Showing all {len(scored_stocks)} stocks with comprehensive scoring</em></p>
-        <table style="width:100%; border-collapse: collapse; margin-bottom: 20px; font-size: 12px;">
-            <tr style="background-color: #f8f9fa;">
-                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Ticker</th>
-                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Company</th>
-                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Sector</th>
-                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Price</th>
-                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Halal</th>
-                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Hedge</th>
-                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Activity</th>
-                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Trend</th>
-                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Fundamental</th>
-                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Overall</th>
-                <th style="border: 1px solid #ddd; padding: 6px; text-align: left;">Sentiment</th>
-            </tr>
-        """
+    def generate_complete_analysis(self, scored_stocks, sorted_stocks=None):
+        """Generate complete stock analysis table, reusing sorted_stocks when already ranked by score."""
+        parts = [_COMPLETE_ANALYSIS_HEADER_TEMPLATE.format(total_stocks=len(scored_stocks))]
         
-        # Sort by overall score
-        sorted_stocks = sorted(scored_stocks, key=lambda x: x['overall_score'], reverse=True)
+        if sorted_stocks is None:
+            # Sort by overall score
+            sorted_stocks = sorted(scored_stocks, key=itemgetter('overall_score'), reverse=True)
         
-        for stock in sorted_stocks:
-            html_content += f"""
-            <tr>
-                <td style="border: 1px solid #ddd; padding: 6px;"><strong>{stock['ticker']}</strong></td>
-                <td style="border: 1px solid #ddd; padding: 6px;">{stock['company_name']}</td>
-                <td style="border: 1px solid #ddd; padding: 6px;">{stock['sector']}</td>
-                <td style="border: 1px solid #ddd; padding: 6px;">${stock['current_price']:.2f}</td>
-                <td style="border: 1px solid #ddd; padding: 6px;">{stock['halal_score']}</td>
-                <td style="border: 1px solid #ddd; padding: 6px;">{stock['hedge_fund_score']}</td>
-                <td style="border: 1px solid #ddd; padding: 6px;">{stock['activity_score']}</td>
-                <td style="border: 1px solid #ddd; padding: 6px;">{stock['trend_score']}</td>
-                <td style="border: 1px solid #ddd; padding: 6px;">{stock['fundamental_score']}</td>
-                <td style="border: 1px solid #ddd; padding: 6px;"><strong>{stock['overall_score']}</strong></td>
-                <td style="border: 1px solid #ddd; padding: 6px;">{stock['sentiment']}</td>
-            </tr>
-            """
+        row_template = _COMPLETE_ANALYSIS_ROW_TEMPLATE.format_map
+        parts.extend(row_template(_escape_row(stock)) for stock in sorted_stocks)
         
-        html_content += "</table>"
-        return html_content
+        parts.append("</table>")
+        return ''.join(parts)
     
     def generate_market_summary(self, scored_stocks):
         """Generate market summary with better space utilization."""
         total_stocks = len(scored_stocks)
-        avg_overall_score = sum(s['overall_score'] for s in scored_stocks) / total_stocks
+        scores = np.fromiter((s['overall_score'] for s in scored_stocks), dtype=np.float64, count=total_stocks)
+        avg_overall_score = scores.mean()
         
         # Count by sentiment
-        sentiment_counts = {}
-        for stock in scored_stocks:
-            sentiment = stock.get('sentiment', 'Unknown')
-            sentiment_counts[sentiment] = sentiment_counts.get(sentiment, 0) + 1
+        sentiment_counts = Counter(stock.get('sentiment', 'Unknown') for stock in scored_stocks)
         
-        # Top sectors
-        sector_scores = {}
-        for stock in scored_stocks:
-            sector = stock.get('sector', 'Unknown')
-            if sector not in sector_scores:
-                sector_scores[sector] = []
-            sector_scores[sector].append(stock['overall_score'])
+        # Top sectors by average score, aggregated with one bincount pass
+        sectors, first_seen, sector_index = np.unique(
+            [s.get('sector', 'Unknown') for s in scored_stocks], return_index=True, return_inverse=True
+        )
+        sector_averages = np.bincount(sector_index, weights=scores) / np.bincount(sector_index)
+        # Stable sort from first-appearance order, so tied sectors keep the order they appear in
+        by_appearance = np.argsort(first_seen)
+        ranked = by_appearance[np.argsort(-sector_averages[by_appearance], kind='stable')]
+        top_sectors = [(sectors[i], sector_averages[i]) for i in ranked[:5]]
         
-        top_sectors = sorted(sector_scores.items(), key=lambda x: sum(x[1])/len(x[1]), reverse=True)[:5]
+        # Calculate counts for quick stats
+        strong_buy_count = sentiment_counts.get('Strong Buy', 0)
+        buy_count = sentiment_counts.get('Buy', 0)
+        hold_count = sentiment_counts.get('Hold', 0)
+        sell_count = sentiment_counts.get('Sell', 0)
         
-        html_content = f"""
+        parts = [f"""
         <h2>📋 Market Summary</h2>
         <div style="background-color: #f8f9fa; padding: 20px; border-radius: 5px; margin-bottom: 20px;">
             <div style="display: flex; justify-content: space-between; align-items: flex-start; gap: 20px;">
@@ -790,14 +796,13 @@ class GoogleSheetsDigestWithData:
                         <div style="flex: 1;">
                             <h4 style="margin-top: 0; color: #34495e; font-size: 14px;">Top Performing Sectors:</h4>
                             <div style="background-color: white; padding: 12px; border-radius: 5px; border: 1px solid #e9ecef;">
-        """
+        """]
         
-        for i, (sector, scores) in enumerate(top_sectors, 1):
-            avg_score = sum(scores) / len(scores)
-            score_color = '#27ae60' if avg_score > 75 else '#f39c12' if avg_score > 65 else '#e74c3c'
-            html_content += f'<p style="margin: 4px 0; font-size: 12px;"><strong>{i}. {sector}:</strong> <span style="color: {score_color}; font-weight: bold;">{avg_score:.2f}</span></p>'
+        for i, (sector, avg_score) in enumerate(top_sectors, 1):
+            score_color = _SECTOR_AVERAGE_COLORS[bisect_left(_SECTOR_AVERAGE_THRESHOLDS, avg_score)]
+            parts.append(f'<p style="margin: 4px 0; font-size: 12px;"><strong>{i}. {escape(str(sector))}:</strong> <span style="color: {score_color}; font-weight: bold;">{avg_score:.2f}</span></p>')
         
-        html_content += """
+        parts.append("""
                             </div>
                         </div>
                         
@@ -805,14 +810,14 @@ class GoogleSheetsDigestWithData:
                         <div style="flex: 1;">
                             <h4 style="margin-top: 0; color: #34495e; font-size: 14px;">Sentiment Distribution:</h4>
                             <div style="background-color: white; padding: 12px; border-radius: 5px; border: 1px solid #e9ecef;">
-        """
+        """)
         
         for sentiment, count in sentiment_counts.items():
             percentage = (count / total_stocks) * 100
-            color = '#27ae60' if sentiment in ['Strong Buy', 'Buy'] else '#e74c3c' if sentiment == 'Sell' else '#f39c12'
-            html_content += f'<p style="margin: 4px 0; font-size: 12px;"><strong>{sentiment}:</strong> <span style="color: {color}; font-weight: bold;">{count} ({percentage:.1f}%)</span></p>'
+            color = _SENTIMENT_COLORS.get(sentiment, '#f39c12')
+            parts.append(f'<p style="margin: 4px 0; font-size: 12px;"><strong>{sentiment}:</strong> <span style="color: {color}; font-weight: bold;">{count} ({percentage:.1f}%)</span></p>')
         
-        html_content += """
+        parts.append(f"""
                             </div>
                         </div>
                         
@@ -830,78 +835,44 @@ class GoogleSheetsDigestWithData:
                 </div>
             </div>
         </div>
-        """
-        
-        # Calculate counts for quick stats
-        strong_buy_count = sentiment_counts.get('Strong Buy', 0)
-        buy_count = sentiment_counts.get('Buy', 0)
-        hold_count = sentiment_counts.get('Hold', 0)
-        sell_count = sentiment_counts.get('Sell', 0)
-        
-        # Replace placeholders
-        html_content = html_content.format(
-            strong_buy_count=strong_buy_count,
-            buy_count=buy_count,
-            hold_count=hold_count,
-            sell_count=sell_count
-        )
+        """)
         
-        return html_content
+        return ''.join(parts)
     
     def generate_html_email(self, top_10_picks, market_insights, complete_analysis, market_summary):
         """Generate complete HTML email."""
         current_date = datetime.now().strftime("%B %d, %Y")
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>Daily Stock Digest - {current_date}</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 1200px; margin: 0 auto; padding: 20px; }}
-                h1 {{ color: #2c3e50; border-bottom: 3px solid #3498db; padding-bottom: 10px; }}
-                h2 {{ color: #34495e; margin-top: 30px; }}
-                h3 {{ color: #7f8c8d; }}
-                .header {{ background-color: #ecf0f1; padding: 20px; border-radius: 5px; margin-bottom: 30px; }}
-                .footer {{ background-color: #bdc3c7; padding: 15px; text-align: center; margin-top: 30px; border-radius: 5px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>📈 Daily Stock Digest</h1>
-                    <p><strong>Date:</strong> {current_date}</p>
-                    <p><strong>Analysis:</strong> Comprehensive stock analysis using Google Sheets data</p>
-                </div>
-                
-                {market_summary}
-                
-                {top_10_picks}
-                
-                {market_insights}
-                
-                {complete_analysis}
-                
-                <div class="footer">
-                    <p><em>This digest was generated automatically using your Google Sheets stock data.</em></p>
-                    <p><em>Powered by Stock Digest Platform</em></p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        html_content = _EMAIL_TEMPLATE.format(
+            current_date=current_date,
+            market_summary=market_summary,
+            top_10_picks=top_10_picks,
+            market_insights=market_insights,
+            complete_analysis=complete_analysis
+        )
         
         return html_content
     
+    def _render_html_email(self, scored_stocks):
+        """Render the full HTML email from the scored stocks."""
+        # Rank once and share the ordering between the sections that need it
+        sorted_stocks = sorted(scored_stocks, key=itemgetter('overall_score'), reverse=True)
+        
+        # Generate email content
+        top_10_picks = self.generate_top_10_picks(scored_stocks, sorted_stocks)
+        market_insights = self.generate_market_insights(scored_stocks)
+        complete_analysis = self.generate_complete_analysis(scored_stocks, sorted_stocks)
+        market_summary = self.generate_market_summary(scored_stocks)
+        
+        return self.generate_html_email(top_10_picks, market_insights, complete_analysis, market_summary)
+    
     async def send_comprehensive_digest(self, worksheet_name="Sheet6", recipient_email=None):
         """Send comprehensive digest email."""
         try:
             logger.info("🚀 Starting comprehensive digest from Google Sheets...")
             
             if not recipient_email:
-                recipient_email = os.getenv("DAILY_DIGEST_RECIPIENT")
+                recipient_email = self.default_recipient
             
             if not recipient_email:
                 logger.error("❌ No recipient email specified")
@@ -913,8 +884,11 @@ class GoogleSheetsDigestWithData:
             if not self.setup_google_sheets():
                 return False
             
-            # Read stocks from sheet
-            stocks = self.read_stocks_from_sheet(worksheet_name)
+            # Read stocks from sheet while the scoring module imports in parallel
+            stocks, _ = await asyncio.gather(
+                asyncio.to_thread(self.read_stocks_from_sheet, worksheet_name),
+                asyncio.to_thread(self._load_scoring_algorithm)
+            )
             if not stocks:
                 logger.error("❌ No stocks found in sheet")
                 return False
@@ -922,14 +896,8 @@ class GoogleSheetsDigestWithData:
             # Calculate scores
             scored_stocks = self.calculate_scores(stocks)
             
-            # Generate email content
-            top_10_picks = self.generate_top_10_picks(scored_stocks)
-            market_insights = self.generate_market_insights(scored_stocks)
-            complete_analysis = self.generate_complete_analysis(scored_stocks)
-            market_summary = self.generate_market_summary(scored_stocks)
-            
             # Generate HTML email
-            html_content = self.generate_html_email(top_10_picks, market_insights, complete_analysis, market_summary)
+            html_content = self._render_html_email(scored_stocks)
             
             # Send email
             success = await self._send_email(recipient_email, f"Daily Stock Digest - {datetime.now().strftime('%B %d, %Y')}", html_content, "Daily Stock Digest")
@@ -945,26 +913,86 @@ class GoogleSheetsDigestWithData:
             logger.error(f"❌ Error in comprehensive digest: {e}")
             return False
     
+    def _get_smtp(self):
+        """Return the cached SMTP connection, (re)connecting and logging in if needed."""
+        import smtplib
+        
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard_smtp()
+        
+        if self.smtp_use_ssl:
+            server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port)
+        else:
+            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+        try:
+            if not self.smtp_use_ssl:
+                server.starttls()
+            server.login(self.smtp_user, self.smtp_password)
+        except Exception:
+            server.close()
+            raise
+        self._smtp = server
+        return server
+    
+    def _send_message(self, msg):
+        """Send a message over the shared SMTP connection, retrying once after a disconnect."""
+        import smtplib
+        
+        with self._smtp_lock:
+            try:
+                self._get_smtp().send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                self._discard_smtp()
+                self._get_smtp().send_message(msg)
+    
+    def _discard_smtp(self):
+        """Close a dead or stale SMTP connection's socket and forget it (caller holds the lock)."""
+        try:
+            self._smtp.close()
+        except OSError:
+            pass
+        self._smtp = None
+    
+    def close_smtp(self):
+        """Close the shared SMTP connection if one is open."""
+        with self._smtp_lock:
+            if self._smtp is not None:
+                import smtplib
+                
+                try:
+                    self._smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    self._smtp.close()
+                self._smtp = None
+    
+    def _build_message(self, to_email, subject, html_content, text_content):
+        """Build a multipart/alternative message with text and HTML bodies."""
+        from email.message import EmailMessage
+        
+        msg = EmailMessage()
+        msg['Subject'] = subject
+        msg['From'] = self.smtp_user
+        msg['To'] = to_email
+        
+        # Text body with an HTML alternative
+        msg.set_content(text_content)
+        msg.add_alternative(html_content, subtype='html')
+        return msg
+    
+    def _build_and_send(self, to_email, subject, html_content, text_content):
+        """Encode and send a message; runs in a worker thread for the async path."""
+        self._send_message(self._build_message(to_email, subject, html_content, text_content))
+    
     async def _send_email(self, to_email: str, subject: str, html_content: str, text_content: str) -> bool:
         """Send email using SMTP."""
         try:
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = self.smtp_user
-            msg['To'] = to_email
-            
-            # Attach both HTML and text versions
-            text_part = MIMEText(text_content, 'plain')
-            html_part = MIMEText(html_content, 'html')
-            
-            msg.attach(text_part)
-            msg.attach(html_part)
-            
-            # Send email
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            # Build (MIME-encode) and send off the event loop over the shared connection
+            await asyncio.to_thread(self._build_and_send, to_email, subject, html_content, text_content)
             
             logger.info(f"✅ Email sent successfully to {to_email}")
             return True
@@ -977,25 +1005,11 @@ class GoogleSheetsDigestWithData:
         """Send email using simple SMTP (synchronous)."""
         try:
             # Get recipient from environment
-            recipient_email = os.getenv("DAILY_DIGEST_RECIPIENT", self.smtp_user)
-            
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f"Daily Stock Digest - {datetime.now().strftime('%B %d, %Y')}"
-            msg['From'] = self.smtp_user
-            msg['To'] = recipient_email
-            
-            # Attach both HTML and text versions
-            text_part = MIMEText(text_content, 'plain')
-            msg.attach(text_part)
-            html_part = MIMEText(html_content, 'html')
-            msg.attach(html_part)
+            recipient_email = self.default_recipient or self.smtp_user
+            subject = f"Daily Stock Digest - {datetime.now().strftime('%B %d, %Y')}"
             
             # Send email
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            self._build_and_send(recipient_email, subject, html_content, text_content)
             
             logger.info(f"✅ Email sent successfully to {recipient_email}")
             return True
@@ -1004,27 +1018,42 @@ class GoogleSheetsDigestWithData:
             logger.error(f"❌ Failed to send email: {e}")
             return False
 
-async def main():
+def parse_args(argv=None):
+    """Parse command-line options for a non-interactive digest run."""
+    parser = argparse.ArgumentParser(description="Send the daily stock digest from Google Sheets data")
+    parser.add_argument("--worksheet", default="Sheet6", help="Worksheet to read (default: Sheet6)")
+    parser.add_argument("--sheets", nargs="*", help="Several worksheets to digest concurrently (overrides --worksheet)")
+    parser.add_argument("--recipient", help="Recipient email (default: DAILY_DIGEST_RECIPIENT from .env)")
+    return parser.parse_args(argv)
+
+async def main(argv=None):
     """Main function."""
+    args = parse_args(argv)
+    
     print("🚀 Google Sheets Digest with Sheet Data")
     print("=" * 50)
     
-    # Get configuration
-    worksheet_name = input("Enter worksheet name (default: Sheet6): ").strip() or "Sheet6"
-    recipient_email = input("Enter recipient email (or press Enter for .env default): ").strip()
-    
-    if not recipient_email:
-        recipient_email = None  # Will use .env default
+    worksheet_names = args.sheets or [args.worksheet]
     
-    # Create analyzer and send digest
+    # Create analyzer and send one digest per worksheet
     analyzer = GoogleSheetsDigestWithData()
-    result = await analyzer.send_comprehensive_digest(worksheet_name, recipient_email)
+    try:
+        results = await asyncio.gather(
+            *(analyzer.send_comprehensive_digest(worksheet_name, args.recipient) for worksheet_name in worksheet_names)
+        )
+    finally:
+        analyzer.close_smtp()
     
-    if result:
+    if all(results):
         print("✅ Digest sent successfully!")
         print("📧 Check your inbox for the comprehensive stock analysis")
-    else:
-        print("❌ Failed to send digest")
+        return True
+    
+    for worksheet_name, result in zip(worksheet_names, results):
+        if not result:
+            print(f"❌ Failed to send digest for {worksheet_name}")
+    return False
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if not asyncio.run(main()):
+        sys.exit(1)
@@ -6,17 +6,47 @@ Calls Yahoo Finance API only once per day with robust caching and fallback logic
 
 import yfinance as yf
 import pandas as pd
+import numpy as np
 import json
 import sqlite3
 import os
 import sys
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Union
 import logging
 from dotenv import load_dotenv
 import time
-import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Optional fast paths; stdlib json is used when orjson is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    from requests_cache import CachedSession
+except ImportError:
+    CachedSession = None
+
+try:
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    pq = None
+    PARQUET_AVAILABLE = False
 
 # Load environment
 env_path = os.path.expanduser("~/stock_digest_platform/.env")
@@ -26,20 +56,70 @@ load_dotenv(env_path)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# SQL used on every run; kept as constants so the connection's statement cache reuses them
+_SQL_INSERT_STOCK = (
+    "INSERT OR REPLACE INTO stocks (ticker, data_json, last_updated, cache_date) VALUES (?, ?, ?, ?)"
+)
+_SQL_UPSERT_METADATA = "INSERT OR REPLACE INTO cache_metadata (key, value) VALUES (?, ?)"
+_SQL_SELECT_METADATA = "SELECT value FROM cache_metadata WHERE key = ?"
+_SQL_SELECT_DAY = "SELECT data_json FROM stocks WHERE cache_date = ?"
+_SQL_SELECT_DAY_TICKERS = "SELECT data_json FROM stocks WHERE cache_date = ? AND ticker IN ({placeholders})"
+_SQL_COUNT_BY_DATE = (
+    "SELECT cache_date, COUNT(*) FROM stocks WHERE cache_date IN (?, ?) GROUP BY cache_date"
+)
+_SQL_COUNT_ALL = "SELECT COUNT(*) FROM stocks"
+_SQL_DELETE_BEFORE = "DELETE FROM stocks WHERE cache_date < ?"
+
+# Parquet files this cache writes as <prefix>_<ISO date>.parquet
+_SNAPSHOT_PREFIXES = ('stocks', 'ohlcv', 'info')
+
+
+def _dumps(obj: Any) -> bytes:
+    """Serialize to JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj).encode()
+
+
+def _loads(data: Union[str, bytes]) -> Any:
+    """Deserialize JSON, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Frame header that marks a zstd-compressed row; plain rows are JSON text
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def _pack_row(stock: Dict[str, Any]) -> Union[str, bytes]:
+    """Encode a cached row, compressing it with zstd when available."""
+    data = _dumps(stock)
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return data.decode()
+
+
+def _unpack_row(value: Union[str, bytes]) -> Dict[str, Any]:
+    """Decode a cached row written by _pack_row (compressed or plain)."""
+    if isinstance(value, bytes) and value[:4] == _ZSTD_MAGIC:
+        value = zstandard.ZstdDecompressor().decompress(value)
+    return _loads(value)
+
+
 class YahooFinanceDailyCache:
     """
     Yahoo Finance Daily Cache System
     
     Features:
     - Calls Yahoo Finance API only once per day
-    - Stores data in both JSON and SQLite for redundancy
+    - Stores data in SQLite, with a Parquet snapshot per day for fast reads
     - Fallback to yesterday's cache if API fails
     - Clean, modular design for easy extension
     """
     
     def __init__(self, cache_dir: str = None, db_name: str = "stock_cache.db"):
         self.cache_dir = cache_dir or os.path.expanduser("~/stock_digest_platform/cache")
-        self.json_cache_file = os.path.join(self.cache_dir, "yahoo_finance_cache.json")
         self.db_file = os.path.join(self.cache_dir, db_name)
         self.cache_metadata_file = os.path.join(self.cache_dir, "cache_metadata.json")
         
@@ -51,6 +131,22 @@ class YahooFinanceDailyCache:
         self.max_retries = 3
         self.retry_delay = 5  # seconds
         
+        # Fetch settings - rate limit is shared across all worker threads
+        self.max_workers = 8
+        self.requests_per_second = 5
+        self._rate_lock = threading.Lock()
+        self._next_request_at = 0.0
+        self._session = None
+        self._session_lock = threading.Lock()
+        
+        # In-process LRU of loaded frames, keyed by (cache_date, tickers)
+        self.memory_cache_size = 32
+        self._memory_cache = OrderedDict()
+        
+        # One connection for the lifetime of the instance keeps SQLite's page cache warm
+        self._conn = None
+        self._db_lock = threading.Lock()
+        
         # Initialize database
         self._init_database()
         
@@ -60,8 +156,13 @@ class YahooFinanceDailyCache:
     def _init_database(self):
         """Initialize SQLite database with proper schema."""
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            cursor = self._conn.cursor()
+            
+            # WAL lets readers run alongside the daily write; the setting persists in the file
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA cache_size=-65536")  # up to 64 MiB of page cache
             
             # Create stocks table
             cursor.execute('''
@@ -69,8 +170,7 @@ class YahooFinanceDailyCache:
                     ticker TEXT PRIMARY KEY,
                     data_json TEXT,
                     last_updated TEXT,
-                    cache_date TEXT,
-                    data_hash TEXT
+                    cache_date TEXT
                 )
             ''')
             
@@ -82,13 +182,13 @@ class YahooFinanceDailyCache:
                 )
             ''')
             
-            # Create index for faster lookups
+            # Create index for faster lookups (date + ticker, replaces the date-only index)
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_cache_date ON stocks(cache_date)
+                CREATE INDEX IF NOT EXISTS idx_date_ticker ON stocks(cache_date, ticker)
             ''')
+            cursor.execute("DROP INDEX IF EXISTS idx_cache_date")
             
-            conn.commit()
-            conn.close()
+            self._conn.commit()
             logger.info("✅ Database initialized successfully")
             
         except Exception as e:
@@ -137,24 +237,18 @@ class YahooFinanceDailyCache:
     def _get_cache_status(self) -> Dict[str, Any]:
         """Get comprehensive cache status."""
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            
-            # Get today's cache count
             today = datetime.now().date().isoformat()
-            cursor.execute("SELECT COUNT(*) FROM stocks WHERE cache_date = ?", (today,))
-            today_count = cursor.fetchone()[0]
-            
-            # Get yesterday's cache count
             yesterday = (datetime.now() - timedelta(days=1)).date().isoformat()
-            cursor.execute("SELECT COUNT(*) FROM stocks WHERE cache_date = ?", (yesterday,))
-            yesterday_count = cursor.fetchone()[0]
             
-            # Get total cached stocks
-            cursor.execute("SELECT COUNT(*) FROM stocks")
-            total_count = cursor.fetchone()[0]
+            with self._db_lock:
+                # Today's and yesterday's counts in one index scan
+                date_counts = dict(self._conn.execute(_SQL_COUNT_BY_DATE, (today, yesterday)).fetchall())
+                
+                # Get total cached stocks
+                total_count = self._conn.execute(_SQL_COUNT_ALL).fetchone()[0]
             
-            conn.close()
+            today_count = date_counts.get(today, 0)
+            yesterday_count = date_counts.get(yesterday, 0)
             
             return {
                 'today_cache_count': today_count,
@@ -171,261 +265,523 @@ class YahooFinanceDailyCache:
             logger.error(f"❌ Cache status check failed: {e}")
             return {}
     
+    def _get_session(self) -> requests.Session:
+        """Get the shared HTTP session used for all Yahoo Finance requests."""
+        # Fetch workers call this concurrently; the lock keeps them from each building a session
+        with self._session_lock:
+            if self._session is None:
+                if CachedSession is not None:
+                    # Repeat runs within the cache window are answered from disk
+                    session = CachedSession(
+                        os.path.join(self.cache_dir, 'yf_http_cache'),
+                        expire_after=self.cache_expiry_hours * 3600,
+                        allowable_methods=('GET', 'HEAD')
+                    )
+                else:
+                    session = requests.Session()
+                
+                retries = Retry(total=self.max_retries, backoff_factor=0.5,
+                                status_forcelist=[429, 500, 502, 503, 504])
+                adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers,
+                                      max_retries=retries)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+            return self._session
+    
+    def _throttle(self):
+        """Block until the shared rate limit allows another request."""
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + 1.0 / self.requests_per_second
+        if wait > 0:
+            time.sleep(wait)
+    
+    def _back_off(self, seconds: float):
+        """Push the next allowed request out so every worker backs off together."""
+        with self._rate_lock:
+            self._next_request_at = max(self._next_request_at, time.monotonic() + seconds)
+    
+    def _download_history(self, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+        """Download one year of daily OHLCV for all tickers in a single batch."""
+        hist_all = yf.download(tickers, period="1y", group_by='ticker', auto_adjust=True,
+                               threads=True, progress=False)
+        
+        if hist_all is None or hist_all.empty:
+            return {}
+        
+        # A single ticker comes back without the ticker column level
+        if not isinstance(hist_all.columns, pd.MultiIndex):
+            return {tickers[0]: hist_all.dropna(how='all')}
+        
+        available = set(hist_all.columns.get_level_values(0))
+        return {
+            ticker: hist_all[ticker].dropna(how='all')
+            for ticker in tickers
+            if ticker in available
+        }
+    
+    def _compute_price_metrics(self, histories: Dict[str, pd.DataFrame]) -> Dict[str, Dict[str, Any]]:
+        """Derive price, volume and technical metrics for all tickers at once.
+        
+        Each ticker's history is right-aligned into a (days, tickers) matrix so
+        that row -k is every ticker's k-th most recent session, then every
+        metric is computed column-wise with NumPy. Tickers whose latest or
+        30-day volume is missing are logged and left out of the result.
+        """
+        tickers = list(histories)
+        frames = [histories[ticker] for ticker in tickers]
+        days = max(len(hist) for hist in frames)
+        lengths = np.array([len(hist) for hist in frames])
+        
+        def stack(column):
+            matrix = np.full((days, len(frames)), np.nan)
+            for j, hist in enumerate(frames):
+                values = hist[column].to_numpy(dtype=float)
+                matrix[days - len(values):, j] = values
+            return matrix
+        
+        closes = stack('Close')
+        volumes = stack('Volume')
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Price data
+            current_price = closes[-1]
+            prev_close = np.where(lengths > 1, closes[-2] if days > 1 else current_price, current_price)
+            change = current_price - prev_close
+            change_percent = np.where(prev_close > 0, change / prev_close * 100, 0)
+            
+            # 52-week calculations
+            high_52w = np.nanmax(stack('High'), axis=0)
+            low_52w = np.nanmin(stack('Low'), axis=0)
+            
+            # Volume analysis
+            avg_volume_30d = np.nanmean(volumes[-30:], axis=0)
+            current_volume = volumes[-1]
+            volume_ratio = np.where(avg_volume_30d > 0, current_volume / avg_volume_30d, 1)
+            
+            # Trend analysis
+            price_30d_ago = np.where(lengths >= 30, closes[-30] if days >= 30 else current_price, current_price)
+            price_90d_ago = np.where(lengths >= 90, closes[-90] if days >= 90 else current_price, current_price)
+            trend_30d = np.where(price_30d_ago > 0, (current_price - price_30d_ago) / price_30d_ago * 100, 0)
+            trend_90d = np.where(price_90d_ago > 0, (current_price - price_90d_ago) / price_90d_ago * 100, 0)
+            
+            # RSI calculation (14-day simple average of gains and losses)
+            deltas = np.diff(closes, axis=0, prepend=np.nan)
+            gain = np.where(deltas > 0, deltas, 0)[-14:].mean(axis=0)
+            loss = np.where(deltas < 0, -deltas, 0)[-14:].mean(axis=0)
+            rsi = np.where(lengths >= 14, 100 - 100 / (1 + gain / loss), 50)
+            
+            # Volatility calculation (annualized sample std of daily returns)
+            returns = closes[1:] / closes[:-1] - 1
+            valid = ~np.isnan(returns)
+            count = valid.sum(axis=0)
+            mean_return = np.where(valid, returns, 0).sum(axis=0) / count
+            squared = np.where(valid, (returns - mean_return) ** 2, 0).sum(axis=0)
+            volatility = np.where(count > 1, np.sqrt(squared / (count - 1)) * (252 ** 0.5), np.nan)
+        
+        columns = {
+            'current_price': np.round(current_price, 2),
+            'change': np.round(change, 2),
+            'change_percent': np.round(change_percent, 2),
+            'high_52w': np.round(high_52w, 2),
+            'low_52w': np.round(low_52w, 2),
+            'open': np.round(stack('Open')[-1], 2),
+            'prev_close': np.round(prev_close, 2),
+            'volume': current_volume,
+            'avg_volume_30d': avg_volume_30d,
+            'volume_ratio': np.round(volume_ratio, 2),
+            'trend_30d': np.round(trend_30d, 2),
+            'trend_90d': np.round(trend_90d, 2),
+            'rsi': np.round(rsi, 2),
+            'volatility': np.round(volatility, 4),
+        }
+        
+        metrics = {}
+        for j, ticker in enumerate(tickers):
+            row = {key: values[j] for key, values in columns.items()}
+            if not (np.isfinite(row['volume']) and np.isfinite(row['avg_volume_30d'])):
+                logger.warning(f"⚠️ Missing volume data for {ticker}")
+                continue
+            row['volume'] = int(row['volume'])
+            row['avg_volume_30d'] = int(row['avg_volume_30d'])
+            metrics[ticker] = row
+        return metrics
+    
+    def _fetch_info(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """Fetch the raw yfinance info dict for a single ticker, or None if it failed."""
+        try:
+            self._throttle()
+            return yf.Ticker(ticker, session=self._get_session()).info
+            
+        except Exception as e:
+            logger.warning(f"⚠️ Error collecting data for {ticker}: {e}")
+            
+            # If it's a rate limit error, make every worker wait
+            if "429" in str(e) or "Too Many Requests" in str(e):
+                logger.info(f"🔄 Rate limit hit, backing off for 10 seconds...")
+                self._back_off(10)
+            
+            return None
+    
+    @staticmethod
+    def _build_stock_info(ticker: str, metrics: Dict[str, Any], info: Dict[str, Any],
+                          cache_date: str) -> Dict[str, Any]:
+        """Combine a ticker's price metrics and raw info into one cached row."""
+        # Comprehensive stock data
+        stock_info = {
+            'ticker': ticker,
+            'company_name': info.get('longName', ticker),
+            'sector': info.get('sector', 'Unknown'),
+            'industry': info.get('industry', 'Unknown'),
+            
+            # Price data
+            'current_price': metrics['current_price'],
+            'change': metrics['change'],
+            'change_percent': metrics['change_percent'],
+            'high_52w': metrics['high_52w'],
+            'low_52w': metrics['low_52w'],
+            'open': metrics['open'],
+            'prev_close': metrics['prev_close'],
+            
+            # Volume data
+            'volume': metrics['volume'],
+            'avg_volume_30d': metrics['avg_volume_30d'],
+            'volume_ratio': metrics['volume_ratio'],
+            
+            # Market data
+            'market_cap': info.get('marketCap', 0),
+            'enterprise_value': info.get('enterpriseValue', 0),
+            'shares_outstanding': info.get('sharesOutstanding', 0),
+            'float_shares': info.get('floatShares', 0),
+            
+            # Valuation metrics
+            'pe_ratio': info.get('trailingPE', 0),
+            'forward_pe': info.get('forwardPE', 0),
+            'peg_ratio': info.get('pegRatio', 0),
+            'pb_ratio': info.get('priceToBook', 0),
+            'ps_ratio': info.get('priceToSalesTrailing12Months', 0),
+            'ev_ebitda': info.get('enterpriseToEbitda', 0),
+            
+            # Financial metrics
+            'debt_to_equity': info.get('debtToEquity', 0),
+            'debt_to_assets': info.get('debtToAssets', 0),
+            'current_ratio': info.get('currentRatio', 0),
+            'quick_ratio': info.get('quickRatio', 0),
+            'free_cash_flow': info.get('freeCashflow', 0),
+            'operating_cash_flow': info.get('operatingCashflow', 0),
+            
+            # Profitability metrics
+            'profit_margin': info.get('profitMargins', 0),
+            'operating_margin': info.get('operatingMargins', 0),
+            'gross_margin': info.get('grossMargins', 0),
+            'ebitda_margins': info.get('ebitdaMargins', 0),
+            
+            # Growth metrics
+            'revenue_growth': info.get('revenueGrowth', 0),
+            'earnings_growth': info.get('earningsGrowth', 0),
+            'eps_growth': info.get('earningsQuarterlyGrowth', 0),
+            
+            # Efficiency metrics
+            'roe': info.get('returnOnEquity', 0),
+            'roa': info.get('returnOnAssets', 0),
+            'roic': info.get('returnOnInvestedCapital', 0),
+            'asset_turnover': info.get('assetTurnover', 0),
+            
+            # EPS data
+            'eps': info.get('trailingEps', 0),
+            'forward_eps': info.get('forwardEps', 0),
+            'book_value': info.get('bookValue', 0),
+            
+            # Dividend data
+            'dividend_rate': info.get('dividendRate', 0),
+            'dividend_yield': info.get('dividendYield', 0),
+            'payout_ratio': info.get('payoutRatio', 0),
+            
+            # Analyst data
+            'recommendation': info.get('recommendationMean', 'Hold'),
+            'recommendation_key': info.get('recommendationKey', 'hold'),
+            'target_price': info.get('targetMeanPrice', 0),
+            'target_high': info.get('targetHighPrice', 0),
+            'target_low': info.get('targetLowPrice', 0),
+            'number_of_analysts': info.get('numberOfAnalystOpinions', 0),
+            
+            # Technical indicators
+            'trend_30d': metrics['trend_30d'],
+            'trend_90d': metrics['trend_90d'],
+            'rsi': metrics['rsi'],
+            'volatility': metrics['volatility'],
+            
+            # Additional metrics
+            'beta': info.get('beta', 0),
+            'short_ratio': info.get('shortRatio', 0),
+            'shares_short': info.get('sharesShort', 0),
+            'shares_short_prev_month': info.get('sharesShortPriorMonth', 0),
+            
+            # Collection timestamp
+            'data_collected_at': datetime.now().isoformat(),
+            'cache_date': cache_date
+        }
+        
+        return stock_info
+    
     def _collect_stock_data_from_yahoo(self, tickers: List[str]) -> List[Dict[str, Any]]:
-        """Collect stock data from Yahoo Finance API with rate limiting."""
+        """Collect stock data from Yahoo Finance: batched history plus rate-limited info fetches."""
         logger.info(f"🔍 Collecting data for {len(tickers)} tickers from Yahoo Finance...")
         
-        stock_data = []
-        successful_count = 0
+        unique_tickers = list(dict.fromkeys(tickers))
+        infos = {}
         failed_count = 0
         
-        for i, ticker in enumerate(tickers, 1):
-            try:
-                logger.info(f"📊 Processing {ticker} ({i}/{len(tickers)})")
-                
-                # Get stock info
-                stock = yf.Ticker(ticker)
-                info = stock.info
-                
-                # Get historical data for calculations
-                hist = stock.history(period="1y")
+        # Price history for every ticker in one request; only fundamentals are per-ticker
+        try:
+            histories = self._download_history(unique_tickers)
+        except Exception as e:
+            logger.error(f"❌ Batch history download failed: {e}")
+            histories = {}
+        
+        fetchable = []
+        for ticker in unique_tickers:
+            hist = histories.get(ticker)
+            if hist is None or hist.empty:
+                logger.warning(f"⚠️ No historical data for {ticker}")
+                failed_count += 1
+            else:
+                fetchable.append(ticker)
+        
+        price_metrics = self._compute_price_metrics({ticker: histories[ticker] for ticker in fetchable}) if fetchable else {}
+        failed_count += len(fetchable) - len(price_metrics)
+        fetchable = [ticker for ticker in fetchable if ticker in price_metrics]
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._fetch_info, ticker): ticker for ticker in fetchable}
+            
+            for i, future in enumerate(as_completed(futures), 1):
+                ticker = futures[future]
+                info = future.result()
+                logger.info(f"📊 Processed {ticker} ({i}/{len(fetchable)})")
                 
-                if hist.empty:
-                    logger.warning(f"⚠️ No historical data for {ticker}")
+                if info is None:
                     failed_count += 1
-                    continue
-                
-                # Calculate derived metrics
-                current_price = hist['Close'].iloc[-1]
-                prev_close = hist['Close'].iloc[-2] if len(hist) > 1 else current_price
-                change = current_price - prev_close
-                change_percent = (change / prev_close) * 100 if prev_close > 0 else 0
-                
-                # 52-week calculations
-                high_52w = hist['High'].max()
-                low_52w = hist['Low'].min()
-                
-                # Volume analysis
-                avg_volume_30d = hist['Volume'].tail(30).mean()
-                current_volume = hist['Volume'].iloc[-1]
-                volume_ratio = current_volume / avg_volume_30d if avg_volume_30d > 0 else 1
-                
-                # Trend analysis
-                price_30d_ago = hist['Close'].iloc[-30] if len(hist) >= 30 else current_price
-                price_90d_ago = hist['Close'].iloc[-90] if len(hist) >= 90 else current_price
-                trend_30d = ((current_price - price_30d_ago) / price_30d_ago) * 100 if price_30d_ago > 0 else 0
-                trend_90d = ((current_price - price_90d_ago) / price_90d_ago) * 100 if price_90d_ago > 0 else 0
-                
-                # RSI calculation (14-day)
-                if len(hist) >= 14:
-                    delta = hist['Close'].diff()
-                    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-                    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-                    rs = gain / loss
-                    rsi = 100 - (100 / (1 + rs.iloc[-1]))
                 else:
-                    rsi = 50
-                
-                # Volatility calculation
-                returns = hist['Close'].pct_change().dropna()
-                volatility = returns.std() * (252 ** 0.5)  # Annualized
-                
-                # Comprehensive stock data
-                stock_info = {
-                    'ticker': ticker,
-                    'company_name': info.get('longName', ticker),
-                    'sector': info.get('sector', 'Unknown'),
-                    'industry': info.get('industry', 'Unknown'),
-                    
-                    # Price data
-                    'current_price': round(current_price, 2),
-                    'change': round(change, 2),
-                    'change_percent': round(change_percent, 2),
-                    'high_52w': round(high_52w, 2),
-                    'low_52w': round(low_52w, 2),
-                    'open': round(hist['Open'].iloc[-1], 2),
-                    'prev_close': round(prev_close, 2),
-                    
-                    # Volume data
-                    'volume': int(current_volume),
-                    'avg_volume_30d': int(avg_volume_30d),
-                    'volume_ratio': round(volume_ratio, 2),
-                    
-                    # Market data
-                    'market_cap': info.get('marketCap', 0),
-                    'enterprise_value': info.get('enterpriseValue', 0),
-                    'shares_outstanding': info.get('sharesOutstanding', 0),
-                    'float_shares': info.get('floatShares', 0),
-                    
-                    # Valuation metrics
-                    'pe_ratio': info.get('trailingPE', 0),
-                    'forward_pe': info.get('forwardPE', 0),
-                    'peg_ratio': info.get('pegRatio', 0),
-                    'pb_ratio': info.get('priceToBook', 0),
-                    'ps_ratio': info.get('priceToSalesTrailing12Months', 0),
-                    'ev_ebitda': info.get('enterpriseToEbitda', 0),
-                    
-                    # Financial metrics
-                    'debt_to_equity': info.get('debtToEquity', 0),
-                    'debt_to_assets': info.get('debtToAssets', 0),
-                    'current_ratio': info.get('currentRatio', 0),
-                    'quick_ratio': info.get('quickRatio', 0),
-                    'free_cash_flow': info.get('freeCashflow', 0),
-                    'operating_cash_flow': info.get('operatingCashflow', 0),
-                    
-                    # Profitability metrics
-                    'profit_margin': info.get('profitMargins', 0),
-                    'operating_margin': info.get('operatingMargins', 0),
-                    'gross_margin': info.get('grossMargins', 0),
-                    'ebitda_margins': info.get('ebitdaMargins', 0),
-                    
-                    # Growth metrics
-                    'revenue_growth': info.get('revenueGrowth', 0),
-                    'earnings_growth': info.get('earningsGrowth', 0),
-                    'eps_growth': info.get('earningsQuarterlyGrowth', 0),
-                    
-                    # Efficiency metrics
-                    'roe': info.get('returnOnEquity', 0),
-                    'roa': info.get('returnOnAssets', 0),
-                    'roic': info.get('returnOnInvestedCapital', 0),
-                    'asset_turnover': info.get('assetTurnover', 0),
-                    
-                    # EPS data
-                    'eps': info.get('trailingEps', 0),
-                    'forward_eps': info.get('forwardEps', 0),
-                    'book_value': info.get('bookValue', 0),
-                    
-                    # Dividend data
-                    'dividend_rate': info.get('dividendRate', 0),
-                    'dividend_yield': info.get('dividendYield', 0),
-                    'payout_ratio': info.get('payoutRatio', 0),
-                    
-                    # Analyst data
-                    'recommendation': info.get('recommendationMean', 'Hold'),
-                    'recommendation_key': info.get('recommendationKey', 'hold'),
-                    'target_price': info.get('targetMeanPrice', 0),
-                    'target_high': info.get('targetHighPrice', 0),
-                    'target_low': info.get('targetLowPrice', 0),
-                    'number_of_analysts': info.get('numberOfAnalystOpinions', 0),
-                    
-                    # Technical indicators
-                    'trend_30d': round(trend_30d, 2),
-                    'trend_90d': round(trend_90d, 2),
-                    'rsi': round(rsi, 2),
-                    'volatility': round(volatility, 4),
-                    
-                    # Additional metrics
-                    'beta': info.get('beta', 0),
-                    'short_ratio': info.get('shortRatio', 0),
-                    'shares_short': info.get('sharesShort', 0),
-                    'shares_short_prev_month': info.get('sharesShortPriorMonth', 0),
-                    
-                    # Collection timestamp
-                    'data_collected_at': datetime.now().isoformat(),
-                    'cache_date': datetime.now().date().isoformat()
-                }
-                
-                stock_data.append(stock_info)
-                successful_count += 1
-                
-                # Rate limiting - be respectful to Yahoo Finance
-                if i % 5 == 0:  # Every 5 requests
-                    time.sleep(2)  # 2 second delay
-                
-                # Additional delay for every 20 requests
-                if i % 20 == 0:
-                    time.sleep(5)  # 5 second delay
-                
-            except Exception as e:
-                logger.warning(f"⚠️ Error collecting data for {ticker}: {e}")
-                failed_count += 1
-                
-                # If it's a rate limit error, wait longer
-                if "429" in str(e) or "Too Many Requests" in str(e):
-                    logger.info(f"🔄 Rate limit hit, waiting 10 seconds before continuing...")
-                    time.sleep(10)
-                
-                continue
+                    infos[ticker] = info
+        
+        # Keep the caller's ticker order regardless of completion order
+        infos = {ticker: infos[ticker] for ticker in unique_tickers if ticker in infos}
+        
+        # Keep the raw inputs so metrics can be recomputed without calling Yahoo again
+        cache_date = datetime.now().date().isoformat()
+        self._save_raw_snapshot({ticker: histories[ticker] for ticker in infos}, infos, cache_date)
+        
+        stock_data = [
+            self._build_stock_info(ticker, price_metrics[ticker], info, cache_date)
+            for ticker, info in infos.items()
+        ]
         
-        logger.info(f"✅ Successfully collected data for {successful_count} stocks, {failed_count} failed")
+        logger.info(f"✅ Successfully collected data for {len(stock_data)} stocks, {failed_count} failed")
         return stock_data
     
     def _save_to_cache(self, stock_data: List[Dict[str, Any]], cache_date: str):
-        """Save stock data to both JSON and SQLite cache."""
+        """Save stock data to the SQLite cache and Parquet snapshot."""
+        self._invalidate_memory_cache(cache_date)
         try:
-            # Save to JSON cache
-            cache_data = {
-                'cache_date': cache_date,
-                'total_stocks': len(stock_data),
-                'data': stock_data,
-                'metadata': {
-                    'generated_at': datetime.now().isoformat(),
-                    'data_version': '1.0'
-                }
-            }
-            
-            with open(self.json_cache_file, 'w') as f:
-                json.dump(cache_data, f, indent=2)
-            
-            # Save to SQLite cache
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            
+            # Serialize every row up front so the write transaction stays short
+            now = datetime.now().isoformat()
+            rows = []
             for stock in stock_data:
-                ticker = stock['ticker']
-                data_json = json.dumps(stock)
-                data_hash = hashlib.md5(data_json.encode()).hexdigest()
-                
-                cursor.execute('''
-                    INSERT OR REPLACE INTO stocks (ticker, data_json, last_updated, cache_date, data_hash)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (ticker, data_json, datetime.now().isoformat(), cache_date, data_hash))
-            
-            # Update cache metadata
-            cursor.execute('''
-                INSERT OR REPLACE INTO cache_metadata (key, value)
-                VALUES (?, ?)
-            ''', ('last_successful_update', datetime.now().isoformat()))
+                rows.append((stock['ticker'], _pack_row(stock), now, cache_date))
             
-            cursor.execute('''
-                INSERT OR REPLACE INTO cache_metadata (key, value)
-                VALUES (?, ?)
-            ''', ('total_stocks_cached', str(len(stock_data))))
+            # Save to SQLite cache in a single transaction
+            with self._db_lock:
+                with self._conn:
+                    cursor = self._conn.cursor()
+                    
+                    cursor.executemany(_SQL_INSERT_STOCK, rows)
+                    
+                    # Update cache metadata
+                    cursor.executemany(_SQL_UPSERT_METADATA, [
+                        ('last_successful_update', now),
+                        ('total_stocks_cached', str(len(stock_data)))
+                    ])
+                
+                # Rebuild the day's Parquet snapshot from everything now cached for that date
+                if PARQUET_AVAILABLE:
+                    cursor.execute(_SQL_SELECT_DAY, (cache_date,))
+                    day_rows = cursor.fetchall()
             
-            conn.commit()
-            conn.close()
+            if PARQUET_AVAILABLE:
+                self._save_snapshot([_unpack_row(row[0]) for row in day_rows], cache_date)
             
             logger.info(f"✅ Data saved to cache: {len(stock_data)} stocks")
             
         except Exception as e:
             logger.error(f"❌ Cache saving failed: {e}")
     
-    def _load_from_cache(self, cache_date: str) -> Optional[List[Dict[str, Any]]]:
-        """Load stock data from cache."""
+    def _get_unavailable_tickers(self, cache_date: str) -> set:
+        """Tickers Yahoo returned no data for on a cache date."""
         try:
-            # Try SQLite first (more reliable)
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
+            with self._db_lock:
+                row = self._conn.execute(_SQL_SELECT_METADATA, ('unavailable_tickers',)).fetchone()
+            if row:
+                unavailable = _loads(row[0])
+                if unavailable.get('date') == cache_date:
+                    return set(unavailable['tickers'])
+        except Exception as e:
+            logger.warning(f"⚠️ Unavailable ticker lookup failed: {e}")
+        return set()
+    
+    def _record_unavailable_tickers(self, cache_date: str, tickers: set):
+        """Remember tickers that failed today so incremental runs don't refetch them until tomorrow."""
+        tickers = tickers | self._get_unavailable_tickers(cache_date)
+        try:
+            value = _dumps({'date': cache_date, 'tickers': sorted(tickers)}).decode()
+            with self._db_lock, self._conn:
+                self._conn.execute(_SQL_UPSERT_METADATA, ('unavailable_tickers', value))
+        except Exception as e:
+            logger.warning(f"⚠️ Recording unavailable tickers failed: {e}")
+    
+    def _snapshot_path(self, cache_date: str) -> str:
+        """Path of the Parquet snapshot for a cache date."""
+        return os.path.join(self.cache_dir, f"stocks_{cache_date}.parquet")
+    
+    def _save_snapshot(self, stock_data: List[Dict[str, Any]], cache_date: str):
+        """Write a day's stock data as a zstd-compressed Parquet snapshot."""
+        path = self._snapshot_path(cache_date)
+        try:
+            pd.DataFrame(stock_data).to_parquet(path, compression='zstd', index=False)
+        except Exception as e:
+            # Columns mixing strings and numbers can't be stored; SQLite still has the data
+            logger.warning(f"⚠️ Parquet snapshot saving failed, using SQLite only: {e}")
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def _raw_snapshot_paths(self, cache_date: str) -> tuple:
+        """Paths of the raw OHLCV and info Parquet files for a cache date."""
+        return (os.path.join(self.cache_dir, f"ohlcv_{cache_date}.parquet"),
+                os.path.join(self.cache_dir, f"info_{cache_date}.parquet"))
+    
+    def _save_raw_snapshot(self, histories: Dict[str, pd.DataFrame], infos: Dict[str, Dict[str, Any]],
+                           cache_date: str):
+        """Persist the raw price history and info the day's metrics were derived from."""
+        if not PARQUET_AVAILABLE or not infos:
+            return
+        
+        ohlcv_path, info_path = self._raw_snapshot_paths(cache_date)
+        try:
+            ohlcv = pd.concat(
+                [hist[['Open', 'High', 'Low', 'Close', 'Volume']] for hist in histories.values()],
+                keys=list(histories), names=['ticker', 'date']
+            ).reset_index()
+            ohlcv.columns = [column.lower() for column in ohlcv.columns]
+            
+            # Info dicts mix types freely, so they are kept as JSON strings
+            info_frame = pd.DataFrame({
+                'ticker': list(infos),
+                'info_json': [_dumps(info).decode() for info in infos.values()]
+            })
+            
+            # Incremental fetches only carry the missing tickers; merge them into the day's
+            # files so earlier tickers survive, replacing any rows being refetched
+            if os.path.exists(ohlcv_path) and os.path.exists(info_path):
+                old_ohlcv = pd.read_parquet(ohlcv_path)
+                old_info = pd.read_parquet(info_path)
+                ohlcv = pd.concat([old_ohlcv[~old_ohlcv['ticker'].isin(infos)], ohlcv], ignore_index=True)
+                info_frame = pd.concat([old_info[~old_info['ticker'].isin(infos)], info_frame], ignore_index=True)
+            
+            ohlcv.to_parquet(ohlcv_path, compression='zstd', index=False)
+            info_frame.to_parquet(info_path, compression='zstd', index=False)
+        except Exception as e:
+            logger.warning(f"⚠️ Raw snapshot saving failed: {e}")
+    
+    def rebuild_from_raw(self, cache_date: str = None) -> pd.DataFrame:
+        """
+        Recompute a day's cached rows from its raw snapshot without calling Yahoo.
+        
+        Use this after changing a metric formula.
+        
+        Args:
+            cache_date: ISO date to rebuild (defaults to today)
             
-            cursor.execute("SELECT data_json FROM stocks WHERE cache_date = ?", (cache_date,))
-            rows = cursor.fetchall()
+        Returns:
+            DataFrame with the rebuilt stock data
+        """
+        cache_date = cache_date or datetime.now().date().isoformat()
+        ohlcv_path, info_path = self._raw_snapshot_paths(cache_date)
+        if not PARQUET_AVAILABLE or not (os.path.exists(ohlcv_path) and os.path.exists(info_path)):
+            raise ValueError(f"No raw snapshot available for {cache_date}")
+        
+        ohlcv = pd.read_parquet(ohlcv_path)
+        ohlcv.columns = [column.capitalize() for column in ohlcv.columns]
+        histories = {
+            ticker: frame.set_index('Date').drop(columns='Ticker')
+            for ticker, frame in ohlcv.groupby('Ticker', sort=False)
+        }
+        info_frame = pd.read_parquet(info_path)
+        infos = dict(zip(info_frame['ticker'], map(_loads, info_frame['info_json'])))
+        
+        tickers = [ticker for ticker in histories if ticker in infos]
+        price_metrics = self._compute_price_metrics({ticker: histories[ticker] for ticker in tickers})
+        stock_data = [
+            self._build_stock_info(ticker, price_metrics[ticker], infos[ticker], cache_date)
+            for ticker in tickers
+            if ticker in price_metrics
+        ]
+        
+        self._save_to_cache(stock_data, cache_date)
+        logger.info(f"✅ Rebuilt {len(stock_data)} stocks from raw snapshot for {cache_date}")
+        return pd.DataFrame(stock_data)
+    
+    def _load_from_cache(self, cache_date: str, tickers: List[str]) -> Optional[pd.DataFrame]:
+        """Load the requested tickers' stock data, serving repeat requests from memory."""
+        key = (cache_date, frozenset(tickers))
+        cached = self._memory_cache.get(key)
+        if cached is not None:
+            self._memory_cache.move_to_end(key)
+            return cached.copy()
+        
+        df = self._read_from_cache(cache_date, tickers)
+        if df is not None:
+            self._memory_cache[key] = df
+            if len(self._memory_cache) > self.memory_cache_size:
+                self._memory_cache.popitem(last=False)
+            return df.copy()
+        return None
+    
+    def _invalidate_memory_cache(self, cache_date: str):
+        """Drop in-memory entries for a cache date after it has been rewritten."""
+        for key in [key for key in self._memory_cache if key[0] == cache_date]:
+            del self._memory_cache[key]
+    
+    def _read_from_cache(self, cache_date: str, tickers: List[str]) -> Optional[pd.DataFrame]:
+        """Read the requested tickers' stock data from the on-disk cache."""
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return None
+        
+        try:
+            # Try the Parquet snapshot first (memory-mapped, filtered before decoding)
+            snapshot_path = self._snapshot_path(cache_date)
+            if PARQUET_AVAILABLE and os.path.exists(snapshot_path):
+                try:
+                    table = pq.read_table(snapshot_path, filters=[('ticker', 'in', tickers)], memory_map=True)
+                    df = table.to_pandas()
+                    logger.info(f"✅ Loaded {len(df)} stocks from Parquet snapshot")
+                    return df
+                except Exception as e:
+                    logger.warning(f"⚠️ Parquet snapshot loading failed: {e}")
+            
+            # Then SQLite (more reliable)
+            placeholders = ','.join('?' * len(tickers))
+            with self._db_lock:
+                rows = self._conn.execute(
+                    _SQL_SELECT_DAY_TICKERS.format(placeholders=placeholders), (cache_date, *tickers)
+                ).fetchall()
             
             if rows:
-                stock_data = [json.loads(row[0]) for row in rows]
-                conn.close()
+                stock_data = [_unpack_row(row[0]) for row in rows]
                 logger.info(f"✅ Loaded {len(stock_data)} stocks from SQLite cache")
-                return stock_data
-            
-            conn.close()
-            
-            # Fallback to JSON cache
-            if os.path.exists(self.json_cache_file):
-                with open(self.json_cache_file, 'r') as f:
-                    cache_data = json.load(f)
-                    if cache_data.get('cache_date') == cache_date:
-                        stock_data = cache_data.get('data', [])
-                        logger.info(f"✅ Loaded {len(stock_data)} stocks from JSON cache")
-                        return stock_data
+                return pd.DataFrame(stock_data)
             
             return None
             
@@ -453,11 +809,26 @@ class YahooFinanceDailyCache:
             # Check if today's cache is valid
             if not force_refresh and cache_status.get('today_cache_valid', False):
                 logger.info("🔄 Using today's cached data")
-                cached_data = self._load_from_cache(current_date)
-                if cached_data:
-                    # Filter to requested tickers
-                    filtered_data = [stock for stock in cached_data if stock['ticker'] in tickers]
-                    return pd.DataFrame(filtered_data)
+                cached_data = self._load_from_cache(current_date, tickers)
+                if cached_data is not None and not cached_data.empty:
+                    # Only fetch the tickers today's cache doesn't have yet, skipping ones that already failed today
+                    fresh = set(cached_data['ticker'])
+                    skip = fresh | self._get_unavailable_tickers(current_date)
+                    missing = [ticker for ticker in dict.fromkeys(tickers) if ticker not in skip]
+                    if not missing:
+                        return cached_data
+                    
+                    logger.info(f"🔄 {len(fresh)} tickers cached today, fetching {len(missing)} missing")
+                    new_data = self._collect_stock_data_from_yahoo(missing)
+                    failed = set(missing) - {stock['ticker'] for stock in new_data}
+                    if failed:
+                        self._record_unavailable_tickers(current_date, failed)
+                    if new_data:
+                        self._save_to_cache(new_data, current_date)
+                        self.cache_metadata['last_successful_update'] = datetime.now().isoformat()
+                        self._save_cache_metadata(self.cache_metadata)
+                        return pd.concat([cached_data, pd.DataFrame(new_data)], ignore_index=True)
+                    return cached_data
             
             # Check if we should call API (only once per day)
             last_api_call = self.cache_metadata.get('last_api_call')
@@ -466,10 +837,9 @@ class YahooFinanceDailyCache:
                 if last_call_date == datetime.now().date() and not force_refresh:
                     logger.info("🔄 API already called today, using yesterday's cache")
                     yesterday = (datetime.now() - timedelta(days=1)).date().isoformat()
-                    cached_data = self._load_from_cache(yesterday)
-                    if cached_data:
-                        filtered_data = [stock for stock in cached_data if stock['ticker'] in tickers]
-                        return pd.DataFrame(filtered_data)
+                    cached_data = self._load_from_cache(yesterday, tickers)
+                    if cached_data is not None and not cached_data.empty:
+                        return cached_data
             
             # Call Yahoo Finance API
             logger.info("🔄 Calling Yahoo Finance API for fresh data...")
@@ -481,6 +851,9 @@ class YahooFinanceDailyCache:
             if stock_data:
                 # Save to cache
                 self._save_to_cache(stock_data, current_date)
+                failed = set(tickers) - {stock['ticker'] for stock in stock_data}
+                if failed:
+                    self._record_unavailable_tickers(current_date, failed)
                 
                 # Update metadata
                 self.cache_metadata['last_successful_update'] = datetime.now().isoformat()
@@ -491,12 +864,11 @@ class YahooFinanceDailyCache:
                 # API failed, try yesterday's cache
                 logger.warning("⚠️ API call failed, trying yesterday's cache...")
                 yesterday = (datetime.now() - timedelta(days=1)).date().isoformat()
-                cached_data = self._load_from_cache(yesterday)
+                cached_data = self._load_from_cache(yesterday, tickers)
                 
-                if cached_data:
-                    filtered_data = [stock for stock in cached_data if stock['ticker'] in tickers]
-                    logger.info(f"✅ Using yesterday's cache: {len(filtered_data)} stocks")
-                    return pd.DataFrame(filtered_data)
+                if cached_data is not None and not cached_data.empty:
+                    logger.info(f"✅ Using yesterday's cache: {len(cached_data)} stocks")
+                    return cached_data
                 else:
                     raise ValueError("No data available from API or cache")
             
@@ -512,7 +884,6 @@ class YahooFinanceDailyCache:
             'cache_status': cache_status,
             'cache_metadata': self.cache_metadata,
             'cache_files': {
-                'json_cache': self.json_cache_file,
                 'sqlite_db': self.db_file,
                 'metadata_file': self.cache_metadata_file
             },
@@ -524,19 +895,36 @@ class YahooFinanceDailyCache:
         try:
             cutoff_date = (datetime.now() - timedelta(days=older_than_days)).date().isoformat()
             
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            
-            cursor.execute("DELETE FROM stocks WHERE cache_date < ?", (cutoff_date,))
-            deleted_count = cursor.rowcount
-            
-            conn.commit()
-            conn.close()
+            with self._db_lock, self._conn:
+                cursor = self._conn.execute(_SQL_DELETE_BEFORE, (cutoff_date,))
+                deleted_count = cursor.rowcount
+            self._memory_cache.clear()
+            
+            # Remove this cache's Parquet snapshots (derived and raw) past the cutoff as well;
+            # the directory is shared, so only dated files with our prefixes are touched
+            for prefix in _SNAPSHOT_PREFIXES:
+                for snapshot in Path(self.cache_dir).glob(f"{prefix}_*.parquet"):
+                    try:
+                        snapshot_date = date.fromisoformat(snapshot.stem[len(prefix) + 1:])
+                    except ValueError:
+                        continue
+                    if snapshot_date.isoformat() < cutoff_date:
+                        snapshot.unlink()
             
             logger.info(f"✅ Cleared {deleted_count} old cache entries")
             
         except Exception as e:
             logger.error(f"❌ Cache clearing failed: {e}")
+    
+    def close(self):
+        """Close the SQLite connection and HTTP session held by this instance."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
 
 
 def get_stock_data_daily(tickers: List[str], force_refresh: bool = False) -> pd.DataFrame:
@@ -550,8 +938,8 @@ def get_stock_data_daily(tickers: List[str], force_refresh: bool = False) -> pd.
     Returns:
         DataFrame with stock data
     """
-    cache_system = YahooFinanceDailyCache()
-    return cache_system.get_stock_data(tickers, force_refresh)
+    with closing(YahooFinanceDailyCache()) as cache_system:
+        return cache_system.get_stock_data(tickers, force_refresh)
 
 
 def main():
@@ -4,40 +4,65 @@ Beautiful, responsive email templates with professional styling
 """
 
 from datetime import datetime
+from functools import reduce
 from typing import List, Dict, Any
+import numpy as np
 import pandas as pd
 
 
-class EmailTemplate:
-    """Generate beautiful HTML email templates for stock digests."""
+def _top_k(stocks: pd.DataFrame, column: str, count: int) -> pd.DataFrame:
+    """
+    Select the `count` largest rows by `column` in linear time.
     
-    @staticmethod
-    def generate_daily_digest_html(scored_stocks: pd.DataFrame, metadata: Dict[str, Any] = None) -> str:
-        """
-        Generate a beautiful HTML email for daily stock digest.
-        
-        Args:
-            scored_stocks: DataFrame with stock data and scores
-            metadata: Optional metadata (generation time, stock count, etc.)
-        
-        Returns:
-            str: Complete HTML email content
-        """
-        if metadata is None:
-            metadata = {}
-        
-        # Prepare data
-        generation_time = metadata.get('generation_time', datetime.now().strftime('%B %d, %Y at %I:%M %p'))
-        total_stocks = len(scored_stocks)
-        
-        # Get top performers
-        top_stocks = scored_stocks.nlargest(10, 'total_score') if 'total_score' in scored_stocks.columns else scored_stocks.head(10)
-        
-        # Get sector breakdown
-        sector_summary = EmailTemplate._get_sector_summary(scored_stocks)
-        
-        # Build HTML
-        html = f"""
+    Matches DataFrame.nlargest(count, column): ties at the cut-off keep the
+    earliest rows, the result is ordered by value then position, and NaN rows
+    only fill in (last) when there are too few scored rows.
+    """
+    if count <= 0:
+        return stocks.iloc[:0]
+    
+    scores = stocks[column].to_numpy(dtype=float)
+    missing = np.isnan(scores)
+    candidates = np.flatnonzero(~missing)
+    
+    if len(candidates) > count:
+        values = scores[candidates]
+        cutoff = -np.partition(-values, count - 1)[count - 1]
+        above = candidates[values > cutoff]
+        ties = candidates[values == cutoff][:count - len(above)]
+        candidates = np.concatenate([above, ties])
+    elif len(candidates) < count:
+        candidates = np.concatenate([candidates, np.flatnonzero(missing)[:count - len(candidates)]])
+    
+    order = candidates[np.lexsort((candidates, -scores[candidates]))]
+    return stocks.iloc[order]
+
+
+# Score bands (lower bounds) and their colors, lowest band first: red, orange, blue, green
+_SCORE_THRESHOLDS = np.array([40, 60, 80])
+_SCORE_COLORS = np.array(['#ef4444', '#f59e0b', '#3b82f6', '#10b981'])
+
+
+def _column_values(stocks: pd.DataFrame, column: str) -> np.ndarray:
+    """Get a numeric column as a float array, or zeros when it is missing."""
+    if column not in stocks.columns:
+        return np.zeros(len(stocks))
+    return stocks[column].to_numpy(dtype=float, na_value=np.nan)
+
+
+def _join_columns(*pieces) -> np.ndarray:
+    """Concatenate string arrays (and scalar strings) element-wise."""
+    return reduce(np.char.add, pieces)
+
+
+def _score_colors(scores: np.ndarray) -> np.ndarray:
+    """Map every score to its band color in one pass (NaN falls in the lowest band)."""
+    bands = np.searchsorted(_SCORE_THRESHOLDS, np.nan_to_num(scores, nan=-np.inf), side='right')
+    return _SCORE_COLORS[bands]
+
+
+# Static outer document of the HTML digest; only the named fields change per send
+_DIGEST_SKELETON = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -83,7 +108,7 @@ class EmailTemplate:
                                     <td style="width: 10px;"></td>
                                     <td style="width: 50%; padding: 20px; background-color: #f8f9fa; border-radius: 8px; text-align: center;">
                                         <div style="font-size: 36px; font-weight: 700; color: #764ba2; margin-bottom: 5px;">
-                                            {len(sector_summary)}
+                                            {sector_count}
                                         </div>
                                         <div style="font-size: 14px; color: #6c757d; text-transform: uppercase; letter-spacing: 0.5px;">
                                             Sectors Covered
@@ -101,7 +126,7 @@ class EmailTemplate:
                                 🏆 Top Performers
                             </h2>
                             
-                            {EmailTemplate._generate_stock_cards(top_stocks)}
+                            {cards}
                         </td>
                     </tr>
                     
@@ -112,7 +137,7 @@ class EmailTemplate:
                                 📊 Sector Breakdown
                             </h2>
                             
-                            {EmailTemplate._generate_sector_cards(sector_summary)}
+                            {sectors}
                         </td>
                     </tr>
                     
@@ -137,29 +162,75 @@ class EmailTemplate:
 </body>
 </html>
 """
-        return html
+
+
+class EmailTemplate:
+    """Generate beautiful HTML email templates for stock digests."""
+    
+    @staticmethod
+    def generate_daily_digest_html(scored_stocks: pd.DataFrame, metadata: Dict[str, Any] = None,
+                                   top_stocks: pd.DataFrame = None,
+                                   sector_summary: List[Dict[str, Any]] = None) -> str:
+        """
+        Generate a beautiful HTML email for daily stock digest.
+        
+        Args:
+            scored_stocks: DataFrame with stock data and scores
+            metadata: Optional metadata (generation time, stock count, etc.)
+            top_stocks: Optional precomputed result of get_top_stocks(scored_stocks)
+            sector_summary: Optional precomputed result of get_sector_summary(scored_stocks)
+        
+        Returns:
+            str: Complete HTML email content
+        """
+        if metadata is None:
+            metadata = {}
+        
+        # Prepare data
+        generation_time = metadata.get('generation_time', datetime.now().strftime('%B %d, %Y at %I:%M %p'))
+        total_stocks = len(scored_stocks)
+        
+        # Get top performers
+        if top_stocks is None:
+            top_stocks = EmailTemplate.get_top_stocks(scored_stocks)
+        
+        # Get sector breakdown
+        if sector_summary is None:
+            sector_summary = EmailTemplate.get_sector_summary(scored_stocks)
+        
+        # Build HTML
+        return _DIGEST_SKELETON.format_map({
+            'generation_time': generation_time,
+            'total_stocks': total_stocks,
+            'sector_count': len(sector_summary),
+            'cards': EmailTemplate._generate_stock_cards(top_stocks),
+            'sectors': EmailTemplate._generate_sector_cards(sector_summary)
+        })
     
     @staticmethod
     def _generate_stock_cards(stocks: pd.DataFrame) -> str:
         """Generate HTML cards for individual stocks."""
-        cards_html = ""
-        
-        for idx, row in stocks.iterrows():
-            ticker = row.get('ticker', 'N/A')
-            company_name = row.get('company_name', ticker)
-            sector = row.get('sector', 'Unknown')
-            total_score = row.get('total_score', 0)
-            price = row.get('current_price', 0)
-            change_percent = row.get('change_percent', 0)
-            
-            # Determine color based on change
-            change_color = '#10b981' if change_percent >= 0 else '#ef4444'
-            change_symbol = '▲' if change_percent >= 0 else '▼'
-            
-            # Score color gradient
-            score_color = EmailTemplate._get_score_color(total_score)
-            
-            card_html = f"""
+        cards = []
+        
+        changes = _column_values(stocks, 'change_percent')
+        scores = _column_values(stocks, 'total_score')
+        
+        # Determine colors based on change and score for all rows at once
+        rising = changes >= 0
+        change_colors = np.where(rising, '#10b981', '#ef4444')
+        change_symbols = np.where(rising, '▲', '▼')
+        score_colors = _score_colors(scores)
+        
+        # Format the numbers column-wise too
+        price_texts = np.char.mod('%.2f', _column_values(stocks, 'current_price'))
+        change_texts = np.char.mod('%.2f', np.abs(changes))
+        score_texts = np.char.mod('%.0f', scores)
+        
+        rows = zip(*EmailTemplate._card_columns(stocks), change_colors, change_symbols, score_colors,
+                   price_texts, change_texts, score_texts)
+        
+        for ticker, company_name, sector, total_score, change_color, change_symbol, score_color, price_text, change_text, score_text in rows:
+            cards.append(f"""
             <div style="background-color: #ffffff; border: 1px solid #e9ecef; border-radius: 8px; padding: 20px; margin-bottom: 15px;">
                 <table role="presentation" style="width: 100%; border-collapse: collapse;">
                     <tr>
@@ -176,10 +247,10 @@ class EmailTemplate:
                         </td>
                         <td style="width: 30%; text-align: right; vertical-align: top;">
                             <div style="font-size: 20px; font-weight: 700; color: #1a1a1a; margin-bottom: 5px;">
-                                ${price:.2f}
+                                ${price_text}
                             </div>
                             <div style="font-size: 14px; font-weight: 600; color: {change_color};">
-                                {change_symbol} {abs(change_percent):.2f}%
+                                {change_symbol} {change_text}%
                             </div>
                         </td>
                     </tr>
@@ -190,22 +261,39 @@ class EmailTemplate:
                                     <div style="width: {min(total_score, 100)}%; height: 100%; background-color: {score_color}; border-radius: 4px;"></div>
                                 </div>
                                 <div style="margin-left: 10px; font-size: 14px; font-weight: 600; color: {score_color};">
-                                    {total_score:.0f}
+                                    {score_text}
                                 </div>
                             </div>
                         </td>
                     </tr>
                 </table>
             </div>
-            """
-            cards_html += card_html
+            """)
+        
+        return "".join(cards)
+    
+    @staticmethod
+    def _card_columns(stocks: pd.DataFrame) -> tuple:
+        """
+        Get the (ticker, company_name, sector, total_score) columns as plain lists.
+        
+        Columns are pulled out once instead of boxing every row into a Series;
+        a missing column falls back to the same defaults the per-row lookups used.
+        """
+        count = len(stocks)
         
-        return cards_html
+        def column(name, default):
+            return stocks[name].tolist() if name in stocks.columns else [default] * count
+        
+        tickers = column('ticker', 'N/A')
+        company_names = stocks['company_name'].tolist() if 'company_name' in stocks.columns else tickers
+        
+        return tickers, company_names, column('sector', 'Unknown'), column('total_score', 0)
     
     @staticmethod
     def _generate_sector_cards(sector_summary: List[Dict[str, Any]]) -> str:
         """Generate HTML cards for sector breakdown."""
-        cards_html = ""
+        cards = []
         
         for sector_data in sector_summary:
             sector_name = sector_data.get('sector', 'Unknown')
@@ -214,7 +302,7 @@ class EmailTemplate:
             
             score_color = EmailTemplate._get_score_color(avg_score)
             
-            card_html = f"""
+            cards.append(f"""
             <div style="background-color: #f8f9fa; border-left: 4px solid {score_color}; border-radius: 6px; padding: 15px 20px; margin-bottom: 12px;">
                 <table role="presentation" style="width: 100%; border-collapse: collapse;">
                     <tr>
@@ -237,47 +325,63 @@ class EmailTemplate:
                     </tr>
                 </table>
             </div>
-            """
-            cards_html += card_html
+            """)
         
-        return cards_html
+        return "".join(cards)
     
     @staticmethod
-    def _get_sector_summary(stocks: pd.DataFrame) -> List[Dict[str, Any]]:
+    def get_top_stocks(stocks: pd.DataFrame, count: int = 10) -> pd.DataFrame:
+        """Get the highest-scoring stocks (or the first rows if unscored)."""
+        if 'total_score' in stocks.columns:
+            return _top_k(stocks, 'total_score', count)
+        return stocks.head(count)
+    
+    @staticmethod
+    def get_sector_summary(stocks: pd.DataFrame) -> List[Dict[str, Any]]:
         """Get sector summary statistics."""
         if 'sector' not in stocks.columns:
             return []
         
-        sector_groups = stocks.groupby('sector').agg({
-            'ticker': 'count',
-            'total_score': 'mean'
-        }).reset_index()
+        # Group rows by sector code (NaN sectors get -1 and are dropped, like groupby)
+        codes, sectors = pd.factorize(stocks['sector'], sort=True)
+        grouped = codes >= 0
+        codes = codes[grouped]
+        groups = len(sectors)
+        
+        tickers_present = stocks['ticker'].notna().to_numpy()[grouped]
+        scores = stocks['total_score'].to_numpy(dtype=float, na_value=np.nan)[grouped]
+        scored = ~np.isnan(scores)
+        
+        counts = np.bincount(codes, weights=tickers_present, minlength=groups)
+        score_counts = np.bincount(codes, weights=scored, minlength=groups)
+        score_sums = np.bincount(codes, weights=np.where(scored, scores, 0.0), minlength=groups)
         
-        sector_groups.columns = ['sector', 'count', 'avg_score']
-        sector_groups = sector_groups.sort_values('avg_score', ascending=False)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_scores = score_sums / score_counts
         
-        return sector_groups.to_dict('records')
+        # Highest average first; sectors without any score go last
+        order = np.argsort(-avg_scores, kind='stable')
+        
+        return [
+            {'sector': sector, 'count': int(count), 'avg_score': float(avg_score)}
+            for sector, count, avg_score in zip(sectors[order], counts[order], avg_scores[order])
+        ]
     
     @staticmethod
     def _get_score_color(score: float) -> str:
         """Get color based on score value."""
-        if score >= 80:
-            return '#10b981'  # Green
-        elif score >= 60:
-            return '#3b82f6'  # Blue
-        elif score >= 40:
-            return '#f59e0b'  # Orange
-        else:
-            return '#ef4444'  # Red
+        return str(_score_colors(score))
     
     @staticmethod
-    def generate_plain_text(scored_stocks: pd.DataFrame, metadata: Dict[str, Any] = None) -> str:
+    def generate_plain_text(scored_stocks: pd.DataFrame, metadata: Dict[str, Any] = None,
+                            top_stocks: pd.DataFrame = None) -> str:
         """
         Generate plain text version of the email for email clients that don't support HTML.
         
         Args:
             scored_stocks: DataFrame with stock data and scores
             metadata: Optional metadata
+            top_stocks: Optional precomputed result of get_top_stocks(scored_stocks)
         
         Returns:
             str: Plain text email content
@@ -288,9 +392,10 @@ class EmailTemplate:
         generation_time = metadata.get('generation_time', datetime.now().strftime('%B %d, %Y at %I:%M %p'))
         total_stocks = len(scored_stocks)
         
-        top_stocks = scored_stocks.nlargest(10, 'total_score') if 'total_score' in scored_stocks.columns else scored_stocks.head(10)
+        if top_stocks is None:
+            top_stocks = EmailTemplate.get_top_stocks(scored_stocks)
         
-        text = f"""
+        parts = [f"""
 DAILY STOCK DIGEST
 {generation_time}
 
@@ -302,32 +407,27 @@ Total Stocks Analyzed: {total_stocks}
 
 TOP PERFORMERS
 --------------
-"""
+"""]
         
-        for idx, row in top_stocks.iterrows():
-            ticker = row.get('ticker', 'N/A')
-            company_name = row.get('company_name', ticker)
-            sector = row.get('sector', 'Unknown')
-            total_score = row.get('total_score', 0)
-            price = row.get('current_price', 0)
-            change_percent = row.get('change_percent', 0)
-            
-            change_symbol = '▲' if change_percent >= 0 else '▼'
-            
-            text += f"""
-{ticker} - {company_name}
-Sector: {sector}
-Price: ${price:.2f} {change_symbol} {abs(change_percent):.2f}%
-Score: {total_score:.0f}/100
-
-"""
+        # Build every stock entry column-wise and add them in one piece
+        tickers, company_names, sectors, _ = EmailTemplate._card_columns(top_stocks)
+        changes = _column_values(top_stocks, 'change_percent')
         
-        text += """
+        entries = _join_columns(
+            '\n', np.array(tickers, dtype=str), ' - ', np.array(company_names, dtype=str),
+            '\nSector: ', np.array(sectors, dtype=str),
+            '\nPrice: $', np.char.mod('%.2f', _column_values(top_stocks, 'current_price')),
+            ' ', np.where(changes >= 0, '▲', '▼'), ' ', np.char.mod('%.2f', np.abs(changes)), '%',
+            '\nScore: ', np.char.mod('%.0f', _column_values(top_stocks, 'total_score')), '/100\n\n'
+        )
+        parts.append("".join(entries.tolist()))
+        
+        parts.append(f"""
 {'=' * 60}
 
 This digest is for informational purposes only and does not constitute investment advice.
 
 Generated by Stock Digest Platform
-"""
+""")
         
-        return text
+        return "".join(parts)
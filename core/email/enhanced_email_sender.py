@@ -5,9 +5,19 @@ Uses the new modern email templates for professional-looking digests
 
 import os
 import sys
+import glob
+import time
+import gzip
+import atexit
+import hashlib
 import logging
+import threading
+import weakref
 from datetime import datetime
+from functools import cached_property, lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait
 import smtplib
+import email.charset
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import pandas as pd
@@ -18,6 +28,52 @@ from core.email.templates.email_template import EmailTemplate
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# UTF-8 parts sent as raw 8bit instead of base64 when the server advertises 8BITMIME
+_UTF8_8BIT = email.charset.Charset('utf-8')
+_UTF8_8BIT.body_encoding = None
+
+# Fallback tickers used when Google Sheets yields none
+_SAMPLE_TICKERS = ('AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'NVDA', 'META', 'NFLX')
+
+# Seconds a ticker list read from Google Sheets is reused before the sheet is read again
+_TICKERS_TTL_SECONDS = 300
+
+# Columns that change on every fetch without changing the digest; left out of the render cache key
+_VOLATILE_COLUMNS = ['data_collected_at']
+
+# Stands in for the generation time in cached renders; the current time is filled in on use
+_GENERATION_TIME_SLOT = '\x00generation_time\x00'
+
+# Plain-text part sent instead of the full text digest when SEND_PLAIN_TEXT=0
+_PLAIN_TEXT_STUB = """Daily Stock Digest
+
+This digest is formatted as HTML. Please open it in an HTML-capable email client.
+"""
+
+# Live senders; a single exit hook closes their SMTP connections without keeping them alive
+_OPEN_SENDERS = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_senders():
+    for sender in list(_OPEN_SENDERS):
+        sender.close()
+
+
+@lru_cache(maxsize=16)
+def _extract_spreadsheet_id(url: str) -> str:
+    """Extract spreadsheet ID from Google Sheets URL."""
+    try:
+        if '/d/' in url:
+            return url.split('/d/')[1].split('/')[0]
+        elif 'spreadsheets/d/' in url:
+            return url.split('spreadsheets/d/')[1].split('/')[0]
+        else:
+            return url
+    except Exception as e:
+        logger.error(f"❌ Error extracting spreadsheet ID: {e}")
+        raise
+
 
 class EnhancedEmailSender:
     """
@@ -29,17 +85,30 @@ class EnhancedEmailSender:
         self.cache_dir = os.path.expanduser("~/stock_digest_platform/cache")
         os.makedirs(self.cache_dir, exist_ok=True)
         
+        # SMTP connection reused across sends; opened lazily by _get_smtp, possibly on a
+        # background thread, so every access goes through the (reentrant) lock
+        self._smtp = None
+        self._smtp_lock = threading.RLock()
+        _OPEN_SENDERS.add(self)
+        
+        # (fetched_at, sheets_url, tickers) from the last successful Google Sheets read
+        self._tickers_cache = None
+        
         # Load environment variables
         self._load_environment()
-        
-        # Initialize smart cache-first system
+    
+    @cached_property
+    def smart_system(self):
+        """Smart cache-first system, imported and initialized on first use."""
         try:
             from core.caching.smart_cache_first_system import SmartCacheFirstSystem
-            self.smart_system = SmartCacheFirstSystem()
-            logger.info("✅ Smart cache-first system initialized")
         except ImportError:
             logger.error("❌ Smart cache-first system not available")
             raise
+        
+        smart_system = SmartCacheFirstSystem()
+        logger.info("✅ Smart cache-first system initialized")
+        return smart_system
     
     def _load_environment(self):
         """Load environment variables for email configuration."""
@@ -50,11 +119,16 @@ class EnhancedEmailSender:
             
             # Email configuration
             self.smtp_host = os.getenv("SMTP_HOST", "smtp.gmail.com")
-            self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
+            # Implicit TLS on 465 skips the STARTTLS round-trips; SMTP_USE_SSL=0 falls back to 587
+            self.smtp_use_ssl = os.getenv("SMTP_USE_SSL", "1") != "0"
+            self.smtp_port = int(os.getenv("SMTP_PORT", "465" if self.smtp_use_ssl else "587"))
             self.smtp_user = os.getenv("SMTP_USER")
             self.smtp_password = os.getenv("SMTP_PASSWORD")
             self.recipient_email = os.getenv("RECIPIENT_EMAIL")
             
+            # Recipients on HTML-capable clients can skip rendering the full plain-text digest
+            self.send_plain_text = os.getenv("SEND_PLAIN_TEXT", "1") != "0"
+            
             if not all([self.smtp_user, self.smtp_password, self.recipient_email]):
                 raise ValueError("Missing email configuration in environment variables")
             
@@ -74,9 +148,15 @@ class EnhancedEmailSender:
         Returns:
             bool: True if email sent successfully, False otherwise
         """
+        logger.info("📧 Starting enhanced daily digest email generation...")
+        
+        # Connect and log in to SMTP in the background; the handshake overlaps data fetch and rendering
+        executor = ThreadPoolExecutor(max_workers=1)
+        smtp_ready = executor.submit(self._get_smtp)
+        executor.shutdown(wait=False)
+        sent = False
+        
         try:
-            logger.info("📧 Starting enhanced daily digest email generation...")
-            
             # Step 1: Get tickers from Google Sheets
             tickers = self._get_tickers_from_sheets()
             if not tickers:
@@ -95,6 +175,9 @@ class EnhancedEmailSender:
             
             logger.info(f"✅ Stock data retrieved: {len(stock_data)} stocks")
             
+            # Placeholder scores are random, so renders are keyed on the data they're derived from
+            cache_prefix = self._render_cache_prefix(stock_data)
+            
             # Step 3: Calculate scores
             logger.info("📊 Calculating stock scores...")
             scored_stocks = self._calculate_stock_scores(stock_data)
@@ -105,16 +188,17 @@ class EnhancedEmailSender:
                 'generation_time': datetime.now().strftime('%B %d, %Y at %I:%M %p'),
                 'total_stocks': len(scored_stocks)
             }
+            html_content, text_content = self._render_digest(scored_stocks, metadata, cache_prefix)
             
-            html_content = EmailTemplate.generate_daily_digest_html(scored_stocks, metadata)
-            text_content = EmailTemplate.generate_plain_text(scored_stocks, metadata)
-            
-            # Step 5: Send email
+            # Step 5: Send email (a failed background connect is retried by _send_email)
             logger.info("📤 Sending email...")
+            if smtp_ready.exception() is not None:
+                logger.warning(f"⚠️ Background SMTP connect failed: {smtp_ready.exception()}")
             success = self._send_email(html_content, text_content)
             
             if success:
                 logger.info("✅ Enhanced daily digest email sent successfully!")
+                sent = True
                 return True
             else:
                 logger.error("❌ Failed to send email")
@@ -123,6 +207,91 @@ class EnhancedEmailSender:
         except Exception as e:
             logger.error(f"❌ Error in daily digest email: {e}")
             return False
+        finally:
+            # Don't leave the background connection open until exit when nothing was sent;
+            # let an in-flight connect finish first so close() sees it
+            if not sent:
+                smtp_ready.cancel()
+                wait([smtp_ready])
+                self.close()
+    
+    def _render_digest(self, scored_stocks: pd.DataFrame, metadata: dict, cache_prefix: str = None) -> tuple:
+        """
+        Render the HTML and plain text digest, reusing today's render of identical data.
+        
+        Renders are gzipped into the cache directory with the generation time left as
+        a slot, so a retry or preview with unchanged data skips the templating but
+        still shows the current time.
+        
+        Args:
+            scored_stocks: DataFrame with stock data and scores
+            metadata: Template metadata (generation time, stock count)
+            cache_prefix: Render cache path prefix from _render_cache_prefix, or None to skip the cache
+        
+        Returns:
+            tuple: (html_content, text_content)
+        """
+        generation_time = metadata['generation_time']
+        metadata = {**metadata, 'generation_time': _GENERATION_TIME_SLOT}
+        
+        if cache_prefix is not None:
+            try:
+                with gzip.open(f"{cache_prefix}.html.gz", 'rt', encoding='utf-8') as f:
+                    html_content = f.read()
+                with gzip.open(f"{cache_prefix}.txt.gz", 'rt', encoding='utf-8') as f:
+                    text_content = f.read()
+                logger.info("✅ Reusing cached digest render")
+                return (html_content.replace(_GENERATION_TIME_SLOT, generation_time),
+                        text_content.replace(_GENERATION_TIME_SLOT, generation_time))
+            except FileNotFoundError:
+                pass
+            except (OSError, EOFError) as e:
+                logger.warning(f"⚠️ Ignoring unreadable cached render: {e}")
+        
+        # Rank and group once; both versions of the email share the results
+        top_stocks = EmailTemplate.get_top_stocks(scored_stocks)
+        sector_summary = EmailTemplate.get_sector_summary(scored_stocks)
+        
+        html_content = EmailTemplate.generate_daily_digest_html(
+            scored_stocks, metadata, top_stocks=top_stocks, sector_summary=sector_summary
+        )
+        if self.send_plain_text:
+            text_content = EmailTemplate.generate_plain_text(scored_stocks, metadata, top_stocks=top_stocks)
+        else:
+            text_content = _PLAIN_TEXT_STUB
+        
+        if cache_prefix is not None:
+            try:
+                # Drop renders from earlier days before adding today's
+                today = os.path.basename(cache_prefix).split('-')[1]
+                for path in glob.glob(os.path.join(self.cache_dir, "digest-*.gz")):
+                    if os.path.basename(path).split('-')[1] != today:
+                        os.remove(path)
+                
+                # Text first: the HTML file only appears once both are complete
+                with gzip.open(f"{cache_prefix}.txt.gz", 'wt', encoding='utf-8', compresslevel=1) as f:
+                    f.write(text_content)
+                with gzip.open(f"{cache_prefix}.html.gz", 'wt', encoding='utf-8', compresslevel=1) as f:
+                    f.write(html_content)
+            except OSError as e:
+                logger.warning(f"⚠️ Could not cache digest render: {e}")
+        
+        return (html_content.replace(_GENERATION_TIME_SLOT, generation_time),
+                text_content.replace(_GENERATION_TIME_SLOT, generation_time))
+    
+    def _render_cache_prefix(self, stock_data: pd.DataFrame):
+        """Get today's render cache path prefix for this data, or None if it cannot be hashed."""
+        stock_data = stock_data.drop(columns=_VOLATILE_COLUMNS, errors='ignore')
+        try:
+            row_hashes = pd.util.hash_pandas_object(stock_data, index=False).to_numpy()
+        except TypeError:
+            return None
+        
+        key = hashlib.blake2b(row_hashes.tobytes(), digest_size=16)
+        key.update(repr(list(stock_data.columns)).encode())
+        key.update(b'text' if self.send_plain_text else b'stub')
+        
+        return os.path.join(self.cache_dir, f"digest-{datetime.now().strftime('%Y%m%d')}-{key.hexdigest()}")
     
     def _send_email(self, html_content: str, text_content: str) -> bool:
         """
@@ -142,18 +311,26 @@ class EnhancedEmailSender:
             msg['From'] = self.smtp_user
             msg['To'] = self.recipient_email
             
-            # Attach both plain text and HTML versions
-            part1 = MIMEText(text_content, 'plain')
-            part2 = MIMEText(html_content, 'html')
-            
-            msg.attach(part1)
-            msg.attach(part2)
-            
-            # Send email
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            with self._smtp_lock:
+                # Skip base64 (a third larger, plus an encoding pass) when the server takes 8-bit bodies
+                server = self._get_smtp()
+                eight_bit = server.has_extn('8bitmime')
+                charset = _UTF8_8BIT if eight_bit else None
+                mail_options = ['BODY=8BITMIME'] if eight_bit else []
+                
+                # Attach both plain text and HTML versions
+                part1 = MIMEText(text_content, 'plain', charset)
+                part2 = MIMEText(html_content, 'html', charset)
+                
+                msg.attach(part1)
+                msg.attach(part2)
+                
+                # Send email over the shared connection, retrying once if the server dropped it
+                try:
+                    server.send_message(msg, mail_options=mail_options)
+                except smtplib.SMTPServerDisconnected:
+                    self._discard_smtp()
+                    self._get_smtp().send_message(msg, mail_options=mail_options)
             
             logger.info("✅ Email sent successfully")
             return True
@@ -162,6 +339,49 @@ class EnhancedEmailSender:
             logger.error(f"❌ Error sending email: {e}")
             return False
     
+    def _get_smtp(self) -> smtplib.SMTP:
+        """Return the cached SMTP connection, (re)connecting and logging in if needed."""
+        with self._smtp_lock:
+            if self._smtp is not None:
+                try:
+                    if self._smtp.noop()[0] == 250:
+                        return self._smtp
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self._discard_smtp()
+            
+            if self.smtp_use_ssl:
+                server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port)
+            else:
+                server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+            try:
+                if not self.smtp_use_ssl:
+                    server.starttls()
+                server.login(self.smtp_user, self.smtp_password)
+            except Exception:
+                server.close()
+                raise
+            self._smtp = server
+            return server
+    
+    def _discard_smtp(self):
+        """Close a dead or stale SMTP connection's socket and forget it (caller holds the lock)."""
+        try:
+            self._smtp.close()
+        except OSError:
+            pass
+        self._smtp = None
+    
+    def close(self):
+        """Close the shared SMTP connection if one is open."""
+        with self._smtp_lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    self._smtp.close()
+                self._smtp = None
+    
     def _get_tickers_from_sheets(self) -> list:
         """Get stock tickers from Google Sheets."""
         try:
@@ -171,6 +391,13 @@ class EnhancedEmailSender:
             credentials_path = os.getenv("GOOGLE_SHEETS_CREDENTIALS_PATH")
             sheets_url = os.getenv("GOOGLE_SHEETS_URL")
             
+            # Reuse a recent read of the same sheet instead of another round-trip
+            if self._tickers_cache is not None:
+                fetched_at, cached_url, cached_tickers = self._tickers_cache
+                if cached_url == sheets_url and time.monotonic() - fetched_at < _TICKERS_TTL_SECONDS:
+                    logger.info(f"✅ Using {len(cached_tickers)} cached tickers from Google Sheets")
+                    return list(cached_tickers)
+            
             if not credentials_path or not os.path.exists(credentials_path):
                 logger.warning("⚠️ Google Sheets credentials not found")
                 return []
@@ -183,7 +410,7 @@ class EnhancedEmailSender:
             client = gspread.authorize(credentials)
             
             # Extract spreadsheet ID from URL
-            spreadsheet_id = self._extract_spreadsheet_id(sheets_url)
+            spreadsheet_id = _extract_spreadsheet_id(sheets_url)
             spreadsheet = client.open_by_key(spreadsheet_id)
             worksheet = spreadsheet.worksheet("Sheet6")
             
@@ -198,28 +425,17 @@ class EnhancedEmailSender:
                         tickers.append(ticker)
             
             logger.info(f"✅ Retrieved {len(tickers)} tickers from Google Sheets")
+            if tickers:
+                self._tickers_cache = (time.monotonic(), sheets_url, tuple(tickers))
             return tickers
             
         except Exception as e:
             logger.warning(f"⚠️ Error reading from Google Sheets: {e}")
             return []
     
-    def _extract_spreadsheet_id(self, url: str) -> str:
-        """Extract spreadsheet ID from Google Sheets URL."""
-        try:
-            if '/d/' in url:
-                return url.split('/d/')[1].split('/')[0]
-            elif 'spreadsheets/d/' in url:
-                return url.split('spreadsheets/d/')[1].split('/')[0]
-            else:
-                return url
-        except Exception as e:
-            logger.error(f"❌ Error extracting spreadsheet ID: {e}")
-            raise
-    
     def _get_sample_tickers(self) -> list:
         """Get sample tickers for testing."""
-        return ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'NVDA', 'META', 'NFLX']
+        return list(_SAMPLE_TICKERS)
     
     def _calculate_stock_scores(self, stock_data: pd.DataFrame) -> pd.DataFrame:
         """
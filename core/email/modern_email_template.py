@@ -6,35 +6,101 @@ Beautiful, responsive HTML email templates with professional design
 
 from datetime import datetime
 from typing import List, Dict, Any
+import numpy as np
 import pandas as pd
 
 
-class ModernEmailTemplate:
+# Timestamp format used when the caller does not pass a generation time
+_GENERATION_TIME_FORMAT = "%B %d, %Y at %I:%M %p"
+
+# Columns read for each stock card/entry, with the default used when a column is missing
+_STOCK_COLUMNS = {
+    'ticker': 'N/A',
+    'sector': 'Unknown Sector',
+    'price_change_pct': 0,
+    'total_score': 0,
+    'momentum_score': 0,
+    'value_score': 0,
+    'quality_score': 0,
+    'volatility_score': 0,
+}
+
+
+def _stock_columns(stocks: pd.DataFrame, sector_default: str = 'Unknown Sector') -> Dict[str, Any]:
     """
-    Modern email template generator with professional design.
-    Drop-in replacement for existing email generation.
+    Pull the stock columns out once: ticker/sector as lists, numbers as float arrays.
+    
+    Rendering then walks flat columns instead of building a Series per row;
+    a missing column holds its _STOCK_COLUMNS default for every row.
     """
+    count = len(stocks)
+    columns = {}
     
-    @staticmethod
-    def generate_html(scored_stocks: pd.DataFrame, generation_time: str = None) -> str:
-        """
-        Generate modern HTML email from scored stocks DataFrame.
-        
-        Args:
-            scored_stocks: DataFrame with stock data and scores
-            generation_time: Optional timestamp string
-            
-        Returns:
-            str: Complete HTML email content
-        """
-        if generation_time is None:
-            generation_time = datetime.now().strftime("%B %d, %Y at %I:%M %p")
-        
-        # Prepare data
-        top_stocks = scored_stocks.nlargest(10, 'total_score') if len(scored_stocks) > 10 else scored_stocks
-        sector_summary = ModernEmailTemplate._get_sector_summary(scored_stocks)
-        
-        html = f"""
+    for column, default in dict(_STOCK_COLUMNS, sector=sector_default).items():
+        if isinstance(default, str):
+            columns[column] = stocks[column].tolist() if column in stocks.columns else [default] * count
+        elif column in stocks.columns:
+            columns[column] = stocks[column].to_numpy(dtype=float, na_value=np.nan)
+        else:
+            columns[column] = np.full(count, float(default))
+    
+    return columns
+
+
+def _format_scores(columns: Dict[str, Any]) -> List[np.ndarray]:
+    """Format the total, momentum, value, quality and volatility scores to one decimal."""
+    return [
+        np.char.mod('%.1f', columns[column])
+        for column in ('total_score', 'momentum_score', 'value_score', 'quality_score', 'volatility_score')
+    ]
+
+
+def _top_stocks(scored_stocks: pd.DataFrame, count: int = 10) -> pd.DataFrame:
+    """
+    Get the `count` highest-scoring rows, or the whole frame if it is not larger.
+    
+    Same rows and order as nlargest(count, 'total_score'), but the cut-off is
+    found with np.partition in linear time and only the kept rows are sorted:
+    ties at the cut-off keep the earliest rows, and NaN scores only fill in last.
+    """
+    if len(scored_stocks) <= count:
+        return scored_stocks
+    
+    scores = scored_stocks['total_score'].to_numpy(dtype=float, na_value=np.nan)
+    missing = np.isnan(scores)
+    candidates = np.flatnonzero(~missing)
+    
+    if len(candidates) > count:
+        values = scores[candidates]
+        cutoff = -np.partition(-values, count - 1)[count - 1]
+        above = candidates[values > cutoff]
+        ties = candidates[values == cutoff][:count - len(above)]
+        candidates = np.concatenate([above, ties])
+    elif len(candidates) < count:
+        candidates = np.concatenate([candidates, np.flatnonzero(missing)[:count - len(candidates)]])
+    
+    order = candidates[np.lexsort((candidates, -scores[candidates]))]
+    return scored_stocks.iloc[order]
+
+
+def _change_arrows(price_changes: np.ndarray) -> np.ndarray:
+    """Get the up/down/flat arrow for every price change (NaN counts as flat)."""
+    return np.select([price_changes > 0, price_changes < 0], ['↑', '↓'], default='→')
+
+
+# Score band lower bounds and their colors, lowest band first: red, yellow, purple, green
+_SCORE_THRESHOLDS = np.array([4.0, 6.0, 8.0])
+_SCORE_COLORS = np.array(['#dc3545', '#ffc107', '#667eea', '#28a745'])
+
+
+def _score_colors(scores) -> np.ndarray:
+    """Look up the band color of every score at once (NaN falls in the lowest band)."""
+    bands = np.searchsorted(_SCORE_THRESHOLDS, np.nan_to_num(scores, nan=-np.inf), side='right')
+    return _SCORE_COLORS[bands]
+
+
+# Static outer document of the HTML email; only the named fields change per send
+_DIGEST_SKELETON = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -71,7 +137,7 @@ class ModernEmailTemplate:
                                 <tr>
                                     <td style="width: 33.33%; text-align: center; padding: 15px; background-color: #f8f9fa; border-radius: 8px;">
                                         <div style="font-size: 28px; font-weight: 700; color: #667eea; margin-bottom: 5px;">
-                                            {len(scored_stocks)}
+                                            {total_stocks}
                                         </div>
                                         <div style="font-size: 12px; color: #6c757d; text-transform: uppercase; letter-spacing: 0.5px;">
                                             Stocks Analyzed
@@ -80,7 +146,7 @@ class ModernEmailTemplate:
                                     <td style="width: 10px;"></td>
                                     <td style="width: 33.33%; text-align: center; padding: 15px; background-color: #f8f9fa; border-radius: 8px;">
                                         <div style="font-size: 28px; font-weight: 700; color: #28a745; margin-bottom: 5px;">
-                                            {len(sector_summary)}
+                                            {sector_count}
                                         </div>
                                         <div style="font-size: 12px; color: #6c757d; text-transform: uppercase; letter-spacing: 0.5px;">
                                             Sectors
@@ -89,7 +155,7 @@ class ModernEmailTemplate:
                                     <td style="width: 10px;"></td>
                                     <td style="width: 33.33%; text-align: center; padding: 15px; background-color: #f8f9fa; border-radius: 8px;">
                                         <div style="font-size: 28px; font-weight: 700; color: #764ba2; margin-bottom: 5px;">
-                                            {top_stocks.iloc[0]['total_score']:.1f}
+                                            {top_score:.1f}
                                         </div>
                                         <div style="font-size: 12px; color: #6c757d; text-transform: uppercase; letter-spacing: 0.5px;">
                                             Top Score
@@ -107,7 +173,7 @@ class ModernEmailTemplate:
                                 🏆 Top Performing Stocks
                             </h2>
                             
-                            {ModernEmailTemplate._generate_stock_cards(top_stocks)}
+                            {stock_cards}
                         </td>
                     </tr>
                     
@@ -118,7 +184,7 @@ class ModernEmailTemplate:
                                 📊 Sector Performance
                             </h2>
                             
-                            {ModernEmailTemplate._generate_sector_summary(sector_summary)}
+                            {sector_cards}
                         </td>
                     </tr>
                     
@@ -143,31 +209,10 @@ class ModernEmailTemplate:
 </body>
 </html>
 """
-        return html
-    
-    @staticmethod
-    def _generate_stock_cards(stocks: pd.DataFrame) -> str:
-        """Generate HTML for stock cards."""
-        cards_html = ""
-        
-        for idx, row in stocks.iterrows():
-            # Determine price change color and arrow
-            price_change = row.get('price_change_pct', 0)
-            if price_change > 0:
-                change_color = "#28a745"
-                arrow = "↑"
-            elif price_change < 0:
-                change_color = "#dc3545"
-                arrow = "↓"
-            else:
-                change_color = "#6c757d"
-                arrow = "→"
-            
-            # Get score color
-            total_score = row.get('total_score', 0)
-            score_color = ModernEmailTemplate._get_score_color(total_score)
-            
-            cards_html += f"""
+
+
+# Per-stock card markup; numbers arrive preformatted
+_STOCK_CARD = """
             <table role="presentation" style="width: 100%; border-collapse: collapse; margin-bottom: 15px; background-color: #ffffff; border: 1px solid #e9ecef; border-radius: 8px; overflow: hidden;">
                 <tr>
                     <td style="padding: 20px;">
@@ -175,18 +220,18 @@ class ModernEmailTemplate:
                             <tr>
                                 <td style="width: 70%;">
                                     <div style="font-size: 18px; font-weight: 700; color: #1a1a1a; margin-bottom: 5px;">
-                                        {row.get('ticker', 'N/A')}
+                                        {ticker}
                                     </div>
                                     <div style="font-size: 14px; color: #6c757d; margin-bottom: 10px;">
-                                        {row.get('sector', 'Unknown Sector')}
+                                        {sector}
                                     </div>
                                     <div style="font-size: 16px; color: {change_color}; font-weight: 600;">
-                                        {arrow} {abs(price_change):.2f}%
+                                        {arrow} {change_text}%
                                     </div>
                                 </td>
                                 <td style="width: 30%; text-align: right; vertical-align: top;">
                                     <div style="display: inline-block; background-color: {score_color}; color: #ffffff; padding: 8px 16px; border-radius: 20px; font-size: 16px; font-weight: 700;">
-                                        {total_score:.1f}
+                                        {score_text}
                                     </div>
                                 </td>
                             </tr>
@@ -197,21 +242,21 @@ class ModernEmailTemplate:
                             <tr>
                                 <td style="padding: 5px 0;">
                                     <span style="display: inline-block; width: 80px;">Momentum:</span>
-                                    <span style="font-weight: 600; color: #1a1a1a;">{row.get('momentum_score', 0):.1f}</span>
+                                    <span style="font-weight: 600; color: #1a1a1a;">{momentum_text}</span>
                                 </td>
                                 <td style="padding: 5px 0;">
                                     <span style="display: inline-block; width: 80px;">Value:</span>
-                                    <span style="font-weight: 600; color: #1a1a1a;">{row.get('value_score', 0):.1f}</span>
+                                    <span style="font-weight: 600; color: #1a1a1a;">{value_text}</span>
                                 </td>
                             </tr>
                             <tr>
                                 <td style="padding: 5px 0;">
                                     <span style="display: inline-block; width: 80px;">Quality:</span>
-                                    <span style="font-weight: 600; color: #1a1a1a;">{row.get('quality_score', 0):.1f}</span>
+                                    <span style="font-weight: 600; color: #1a1a1a;">{quality_text}</span>
                                 </td>
                                 <td style="padding: 5px 0;">
                                     <span style="display: inline-block; width: 80px;">Volatility:</span>
-                                    <span style="font-weight: 600; color: #1a1a1a;">{row.get('volatility_score', 0):.1f}</span>
+                                    <span style="font-weight: 600; color: #1a1a1a;">{volatility_text}</span>
                                 </td>
                             </tr>
                         </table>
@@ -219,20 +264,18 @@ class ModernEmailTemplate:
                 </tr>
             </table>
             """
-        
-        return cards_html
-    
-    @staticmethod
-    def _generate_sector_summary(sector_summary: Dict[str, Dict[str, Any]]) -> str:
-        """Generate HTML for sector summary."""
-        sector_html = ""
-        
-        for sector, data in sorted(sector_summary.items(), key=lambda x: x[1]['avg_score'], reverse=True):
-            avg_score = data['avg_score']
-            count = data['count']
-            score_color = ModernEmailTemplate._get_score_color(avg_score)
-            
-            sector_html += f"""
+
+# Per-stock entry of the plain text email; numbers arrive preformatted
+_STOCK_ENTRY = """
+{ticker} - Score: {score_text}
+Sector: {sector}
+Price Change: {arrow} {change_text}%
+Scores - Momentum: {momentum_text} | Value: {value_text} | Quality: {quality_text} | Volatility: {volatility_text}
+
+"""
+
+# Per-sector card markup
+_SECTOR_CARD = """
             <table role="presentation" style="width: 100%; border-collapse: collapse; margin-bottom: 12px;">
                 <tr>
                     <td style="padding: 15px; background-color: #f8f9fa; border-radius: 8px;">
@@ -243,7 +286,7 @@ class ModernEmailTemplate:
                                         {sector}
                                     </div>
                                     <div style="font-size: 13px; color: #6c757d;">
-                                        {count} stock{'s' if count != 1 else ''}
+                                        {count} stock{plural}
                                     </div>
                                 </td>
                                 <td style="width: 40%; text-align: right;">
@@ -257,34 +300,42 @@ class ModernEmailTemplate:
                 </tr>
             </table>
             """
-        
-        return sector_html
+
+
+class ModernEmailTemplate:
+    """
+    Modern email template generator with professional design.
+    Drop-in replacement for existing email generation.
+    """
     
     @staticmethod
-    def _get_sector_summary(scored_stocks: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
-        """Calculate sector summary statistics."""
-        sector_summary = {}
-        
-        for sector in scored_stocks['sector'].unique():
-            sector_stocks = scored_stocks[scored_stocks['sector'] == sector]
-            sector_summary[sector] = {
-                'count': len(sector_stocks),
-                'avg_score': sector_stocks['total_score'].mean()
-            }
+    def generate(scored_stocks: pd.DataFrame, generation_time: str = None) -> tuple:
+        """
+        Generate both the HTML and plain text emails, sharing the ranking and sector work.
         
-        return sector_summary
+        Args:
+            scored_stocks: DataFrame with stock data and scores
+            generation_time: Optional timestamp string
+            
+        Returns:
+            tuple: (html_content, text_content)
+        """
+        prepared = ModernEmailTemplate._prepare(scored_stocks, generation_time)
+        return ModernEmailTemplate._render_html(prepared), ModernEmailTemplate._render_text(prepared)
     
     @staticmethod
-    def _get_score_color(score: float) -> str:
-        """Get color based on score value."""
-        if score >= 8.0:
-            return "#28a745"  # Green
-        elif score >= 6.0:
-            return "#667eea"  # Purple
-        elif score >= 4.0:
-            return "#ffc107"  # Yellow
-        else:
-            return "#dc3545"  # Red
+    def generate_html(scored_stocks: pd.DataFrame, generation_time: str = None) -> str:
+        """
+        Generate modern HTML email from scored stocks DataFrame.
+        
+        Args:
+            scored_stocks: DataFrame with stock data and scores
+            generation_time: Optional timestamp string
+            
+        Returns:
+            str: Complete HTML email content
+        """
+        return ModernEmailTemplate._render_html(ModernEmailTemplate._prepare(scored_stocks, generation_time))
     
     @staticmethod
     def generate_text(scored_stocks: pd.DataFrame, generation_time: str = None) -> str:
@@ -298,12 +349,113 @@ class ModernEmailTemplate:
         Returns:
             str: Plain text email content
         """
+        return ModernEmailTemplate._render_text(ModernEmailTemplate._prepare(scored_stocks, generation_time))
+    
+    @staticmethod
+    def _prepare(scored_stocks: pd.DataFrame, generation_time: str = None) -> Dict[str, Any]:
+        """Compute the data both email versions are rendered from."""
         if generation_time is None:
-            generation_time = datetime.now().strftime("%B %d, %Y at %I:%M %p")
+            generation_time = datetime.now().strftime(_GENERATION_TIME_FORMAT)
+        
+        return {
+            'generation_time': generation_time,
+            'total_stocks': len(scored_stocks),
+            'top_stocks': _top_stocks(scored_stocks),
+            'sector_summary': ModernEmailTemplate._get_sector_summary(scored_stocks)
+        }
+    
+    @staticmethod
+    def _render_html(prepared: Dict[str, Any]) -> str:
+        """Render the HTML email from _prepare's output."""
+        top_stocks = prepared['top_stocks']
+        sector_summary = prepared['sector_summary']
         
-        top_stocks = scored_stocks.nlargest(10, 'total_score') if len(scored_stocks) > 10 else scored_stocks
+        return _DIGEST_SKELETON.format(
+            generation_time=prepared['generation_time'],
+            total_stocks=prepared['total_stocks'],
+            sector_count=len(sector_summary),
+            top_score=top_stocks.iloc[0]['total_score'],
+            stock_cards=ModernEmailTemplate._generate_stock_cards(top_stocks),
+            sector_cards=ModernEmailTemplate._generate_sector_summary(sector_summary)
+        )
+    
+    @staticmethod
+    def _generate_stock_cards(stocks: pd.DataFrame) -> str:
+        """Generate HTML for stock cards."""
+        cards = []
         
-        text = f"""
+        columns = _stock_columns(stocks)
+        price_changes = columns['price_change_pct']
+        
+        # Determine price change color and arrow, and score color, for all rows at once
+        change_colors = np.select([price_changes > 0, price_changes < 0], ['#28a745', '#dc3545'], default='#6c757d')
+        arrows = _change_arrows(price_changes)
+        score_colors = _score_colors(columns['total_score'])
+        
+        # Format the numbers column-wise too; each card only fills in the template
+        change_texts = np.char.mod('%.2f', np.abs(price_changes))
+        score_texts, momentum_texts, value_texts, quality_texts, volatility_texts = _format_scores(columns)
+        
+        rows = zip(columns['ticker'], columns['sector'], change_colors, arrows, change_texts,
+                   score_colors, score_texts, momentum_texts, value_texts, quality_texts, volatility_texts)
+        
+        for ticker, sector, change_color, arrow, change_text, score_color, score_text, momentum_text, value_text, quality_text, volatility_text in rows:
+            cards.append(_STOCK_CARD.format(
+                ticker=ticker, sector=sector, change_color=change_color, arrow=arrow, change_text=change_text,
+                score_color=score_color, score_text=score_text, momentum_text=momentum_text,
+                value_text=value_text, quality_text=quality_text, volatility_text=volatility_text
+            ))
+        
+        return "".join(cards)
+    
+    @staticmethod
+    def _generate_sector_summary(sector_summary: pd.DataFrame) -> str:
+        """Generate HTML for sector summary."""
+        sectors = []
+        
+        counts = sector_summary['count'].to_numpy()
+        avg_scores = sector_summary['avg_score'].to_numpy(dtype=float)
+        score_colors = _score_colors(avg_scores)
+        plurals = np.where(counts == 1, '', 's')
+        
+        rows = zip(sector_summary.index.tolist(), counts.tolist(), plurals, avg_scores.tolist(), score_colors)
+        
+        for sector, count, plural, avg_score, score_color in rows:
+            sectors.append(_SECTOR_CARD.format(
+                sector=sector, count=count, plural=plural,
+                score_color=score_color, avg_score=avg_score
+            ))
+        
+        return "".join(sectors)
+    
+    @staticmethod
+    def _get_sector_summary(scored_stocks: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calculate sector summary statistics.
+        
+        Returns:
+            pd.DataFrame: count and avg_score per sector (index), best average first;
+            equal averages keep first-appearance order and NaN averages go last
+        """
+        # One grouped pass, sectors kept in order of first appearance
+        sector_groups = scored_stocks.groupby('sector', sort=False, dropna=False)['total_score'].agg(
+            count='size', avg_score='mean'
+        )
+        
+        return sector_groups.sort_values('avg_score', ascending=False, kind='stable')
+    
+    @staticmethod
+    def _get_score_color(score: float) -> str:
+        """Get color based on score value."""
+        return str(_score_colors(score))
+    
+    @staticmethod
+    def _render_text(prepared: Dict[str, Any]) -> str:
+        """Render the plain text email from _prepare's output."""
+        generation_time = prepared['generation_time']
+        top_stocks = prepared['top_stocks']
+        
+        parts = [f"""
 DAILY STOCK DIGEST
 {generation_time}
 
@@ -311,8 +463,8 @@ DAILY STOCK DIGEST
 
 SUMMARY
 -------
-Total Stocks Analyzed: {len(scored_stocks)}
-Sectors Covered: {len(scored_stocks['sector'].unique())}
+Total Stocks Analyzed: {prepared['total_stocks']}
+Sectors Covered: {len(prepared['sector_summary'])}
 Top Score: {top_stocks.iloc[0]['total_score']:.1f}
 
 {'='*60}
@@ -320,25 +472,28 @@ Top Score: {top_stocks.iloc[0]['total_score']:.1f}
 TOP PERFORMING STOCKS
 ---------------------
 
-"""
+"""]
         
-        for idx, row in top_stocks.iterrows():
-            price_change = row.get('price_change_pct', 0)
-            arrow = "↑" if price_change > 0 else "↓" if price_change < 0 else "→"
-            
-            text += f"""
-{row.get('ticker', 'N/A')} - Score: {row.get('total_score', 0):.1f}
-Sector: {row.get('sector', 'Unknown')}
-Price Change: {arrow} {abs(price_change):.2f}%
-Scores - Momentum: {row.get('momentum_score', 0):.1f} | Value: {row.get('value_score', 0):.1f} | Quality: {row.get('quality_score', 0):.1f} | Volatility: {row.get('volatility_score', 0):.1f}
-
-"""
+        columns = _stock_columns(top_stocks, 'Unknown')
+        arrows = _change_arrows(columns['price_change_pct'])
+        change_texts = np.char.mod('%.2f', np.abs(columns['price_change_pct']))
+        score_texts, momentum_texts, value_texts, quality_texts, volatility_texts = _format_scores(columns)
+        
+        rows = zip(columns['ticker'], columns['sector'], arrows, change_texts,
+                   score_texts, momentum_texts, value_texts, quality_texts, volatility_texts)
         
-        text += f"""
+        for ticker, sector, arrow, change_text, score_text, momentum_text, value_text, quality_text, volatility_text in rows:
+            parts.append(_STOCK_ENTRY.format(
+                ticker=ticker, sector=sector, arrow=arrow, change_text=change_text, score_text=score_text,
+                momentum_text=momentum_text, value_text=value_text, quality_text=quality_text,
+                volatility_text=volatility_text
+            ))
+        
+        parts.append(f"""
 {'='*60}
 
 Generated by Stock Digest Platform
 Data sourced from Yahoo Finance & Alpha Vantage
-"""
+""")
         
-        return text
+        return "".join(parts)
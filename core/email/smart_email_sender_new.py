@@ -72,8 +72,7 @@ class SmartEmailSender:
         
         if self.use_modern_template:
             try:
-                html_content = self.modern_template.generate_html(scored_stocks, generation_time)
-                text_content = self.modern_template.generate_text(scored_stocks, generation_time)
+                html_content, text_content = self.modern_template.generate(scored_stocks, generation_time)
                 logger.info("✅ Generated email using modern templates")
             except Exception as e:
                 logger.warning(f"⚠️ Modern template failed, using legacy: {e}")